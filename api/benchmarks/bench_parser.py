@@ -0,0 +1,49 @@
+"""
+Microbenchmark do parsing dos filtros de busca.
+
+Compara o custo por requisição do caminho antigo (gramática compilada a cada
+chamada, parser Earley) com o atual (parser LALR compilado na importação +
+cache LRU dos filtros transformados).
+
+Uso (a partir da pasta api/):
+    python -m benchmarks.bench_parser
+"""
+import timeit
+
+from lark import Lark
+
+from search_grammar.grammar import grammar
+from search_grammar.parsers import parse_filtro
+from search_grammar.transformer import FiltroTransformer
+
+FILTROS = [
+    '"ana"',
+    'pessoa LIKE "silva" AND cargo = "Coordenador"',
+    '(orgao LIKE "INF" OR orgao LIKE "DELET") AND NOT mandato > 1',
+    'inicio > "2020-01-01" AND fim < "31/12/2024"',
+    'ELECTABLE TO "Chefe" DE "Departamento de Informática"',
+]
+
+REPETICOES = 200
+
+
+def parse_antigo(filtro, categoria_atual="pessoa"):
+    parser = Lark(grammar, start="start")
+    transformer = FiltroTransformer(categoria_atual=categoria_atual)
+    return transformer.transform(parser.parse(filtro))
+
+
+def parse_sem_cache(filtro, categoria_atual="pessoa"):
+    return parse_filtro.__wrapped__(filtro, categoria_atual)
+
+
+def medir(nome, funcao):
+    total = timeit.timeit(lambda: [funcao(f) for f in FILTROS], number=REPETICOES)
+    por_chamada = total / (REPETICOES * len(FILTROS)) * 1e6
+    print(f"{nome:<32} {por_chamada:>10.1f} µs/filtro")
+
+
+if __name__ == "__main__":
+    medir("Earley, compilando por chamada", parse_antigo)
+    medir("LALR compilado, sem cache", parse_sem_cache)
+    medir("LALR compilado, com cache LRU", parse_filtro)
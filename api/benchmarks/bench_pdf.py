@@ -0,0 +1,80 @@
+"""
+Benchmark da geração do relatório PDF.
+
+Compara, para 1k, 10k e 100k ocupações, a renderização atual (uma tabela por
+grupo/bloco de TAMANHO_BLOCO_PDF linhas) com a tabela única usada antes
+(simulada com um bloco do tamanho da lista inteira, no modo flat).
+
+A tabela única a partir de 100k linhas leva muitos minutos; por padrão ela só é
+medida até 10k. Use --tabela-unica-100k para medir também esse caso.
+
+Uso (a partir da pasta api/):
+    python -m benchmarks.bench_pdf [--tabela-unica-100k]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from routers import relatorio
+from routers.relatorio import renderizar_pdf
+
+TAMANHOS = [1_000, 10_000, 100_000]
+OCUPACOES_POR_GRUPO = 15
+
+
+def gerar_dados(n, tipo):
+    random.seed(n)
+    linhas = []
+    for i in range(n):
+        inicio = date(2010, 1, 1) + timedelta(days=random.randint(0, 5000))
+        linhas.append({
+            "pessoa": f"Pessoa {random.randint(1, n // 3 + 1)}",
+            "cargo": f"Cargo {i // OCUPACOES_POR_GRUPO}",
+            "orgao": f"Órgão {i // (OCUPACOES_POR_GRUPO * 10)}",
+            "data_inicio": inicio,
+            "data_fim": inicio + timedelta(days=random.randint(30, 1500)),
+            "mandato": random.randint(1, 3),
+            "observacoes": "Observação de teste" if i % 4 == 0 else None,
+            "exclusivo": i % 2 == 0,
+        })
+
+    if tipo == "flat":
+        return linhas
+
+    grupos = []
+    for i in range(0, n, OCUPACOES_POR_GRUPO):
+        bloco = linhas[i:i + OCUPACOES_POR_GRUPO]
+        grupos.append({"cargo": bloco[0]["cargo"], "orgao": bloco[0]["orgao"], "ocupacoes": bloco})
+    return grupos
+
+
+def medir(nome, n, dados, tipo):
+    descritor, caminho = tempfile.mkstemp(suffix=".pdf")
+    os.close(descritor)
+    try:
+        inicio = time.perf_counter()
+        renderizar_pdf(dados, tipo, caminho)
+        duracao = time.perf_counter() - inicio
+        tamanho = os.path.getsize(caminho) / 1024
+    finally:
+        os.remove(caminho)
+    print(f"{nome:<28} {n:>8} ocupações {duracao:>9.2f} s {tamanho:>10.0f} KiB")
+
+
+if __name__ == "__main__":
+    tabela_unica_100k = "--tabela-unica-100k" in sys.argv
+    bloco_padrao = relatorio.TAMANHO_BLOCO_PDF
+
+    for n in TAMANHOS:
+        medir("cargo, tabela por grupo", n, gerar_dados(n, "cargo"), "cargo")
+
+        flat = gerar_dados(n, "flat")
+        medir(f"flat, blocos de {bloco_padrao}", n, flat, "flat")
+
+        if n < 100_000 or tabela_unica_100k:
+            relatorio.TAMANHO_BLOCO_PDF = n
+            medir("flat, tabela única", n, flat, "flat")
+            relatorio.TAMANHO_BLOCO_PDF = bloco_padrao
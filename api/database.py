@@ -30,6 +30,8 @@ def get_session():
 def init_db():
     
         # Verifica se já existe alguma tabela no schema público
+    # (engine.begin() confirma schema.sql e upgrade.sql juntos ao sair do bloco;
+    # um commit explícito aqui fecharia a transação antes do upgrade)
     with engine.begin() as conn:
 
         #conn.execute(text("""
@@ -47,7 +49,6 @@ def init_db():
         if tables_count == 0:
             with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
                 conn.execute(text(f.read()))
-            conn.commit()
             print("Banco inicializado com sucesso!")        
 
         else:
@@ -58,7 +59,6 @@ def init_db():
                 return
             f.seek(0)  # Volta ao início do arquivo
             conn.execute(text(f.read()))
-        conn.commit()
         print("Banco atualizado com sucesso!")
 
 
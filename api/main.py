@@ -6,6 +6,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from contextlib import asynccontextmanager
 from database import init_db
+from routers.relatorio import GERENCIADOR_EXPORTACOES, encerrar_pool_pdf
 import routers  # importa o pacote raiz
 
 
@@ -15,6 +16,8 @@ async def lifespan(app: FastAPI):
     init_db()
     yield
     # Executa na finalização da aplicação (se quiser limpar algo)
+    GERENCIADOR_EXPORTACOES.encerrar()
+    encerrar_pool_pdf()
     print("Encerrando aplicação...")
 
 app = FastAPI(
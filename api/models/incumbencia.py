@@ -0,0 +1,9 @@
+from sqlmodel import SQLModel, Field
+
+# Tabela mantida pelo banco (trigger update_incumbencia em upgrade.sql):
+# guarda, para cada cargo, a ocupação mais recente e o mandato consecutivo dela.
+class Incumbencia(SQLModel, table=True):
+    id_cargo: int = Field(primary_key=True, foreign_key="cargo.id_cargo")
+    id_pessoa: int = Field(foreign_key="pessoa.id_pessoa")
+    id_ocupacao: int = Field(foreign_key="ocupacao.id_ocupacao")
+    mandatos_consecutivos: int
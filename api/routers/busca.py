@@ -1,14 +1,23 @@
+import base64
+import binascii
+import json
+from datetime import date
+from itertools import groupby
 from operator import itemgetter
-from typing import Any, Callable, Dict, List, Tuple
-from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query
-from sqlmodel import Session, and_, func, or_, select
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import Date, Text, case, cast, false, literal, literal_column, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlmodel import Session, and_, func, nulls_first, nulls_last, or_, select
 from models.orgao import Orgao
 from models.cargo import Cargo 
 from models.pessoa import Pessoa
 from models.ocupacao import Ocupacao
-from database import get_session
-from collections import defaultdict
+from database import engine, get_session
 from search_grammar.parsers import parse_filtro, traduzir_parsing_result
+from utils.cache import CacheVersionado
+from utils.etag import calcular_validador, resposta_condicional
 
 router = APIRouter(
     prefix="/api",
@@ -96,17 +105,37 @@ CHAVES_ORDENAVEIS = {
     "exclusivo": "exclusivo",
 }
 
+# Mapeamento: "Chave do Dicionário Python" -> coluna SQL equivalente
+COLUNAS_ORDENAVEIS = {
+    "pessoa": Pessoa.nome,
+    "cargo": Cargo.nome,
+    "orgao": Orgao.nome,
+    "data_inicio": Ocupacao.data_inicio,
+    "data_fim": Ocupacao.data_fim,
+    "exclusivo": Cargo.exclusivo,
+}
 
-def safe_key(valor):
-    if valor is None:
-        return (0, None)
-    return (1, valor)
+# Identificador estável de cada unidade (grupo, ou linha no modo flat)
+CHAVES_GRUPO = {
+    "pessoa": Pessoa.id_pessoa,
+    "orgao": Orgao.id_orgao,
+    "cargo": Cargo.id_cargo,
+    "flat": Ocupacao.id_ocupacao,
+}
+
+# Chaves de ordenação que ordenam os próprios grupos; as demais ordenam as linhas dentro de cada grupo
+CHAVES_DO_GRUPO = {
+    "pessoa": {"pessoa"},
+    "orgao": {"orgao"},
+    "cargo": {"cargo", "orgao"},
+    "flat": set(CHAVES_ORDENAVEIS.values()),
+}
 
 
 
-def obter_chave_ordenacao(sort_by_order_str: str) -> Tuple[Callable[[Dict[str, Any]], Any], bool]:
+def obter_chave_ordenacao(sort_by_order_str: str) -> Tuple[Optional[str], bool]:
     """
-    Retorna a chave de ordenação (função itemgetter ou uma função lambda customizada) e a direção.
+    Retorna a chave de ordenação (chave do dicionário de resultado) e a direção.
     """
     try:
         chave_raw, order_raw = sort_by_order_str.split(",")
@@ -125,6 +154,52 @@ def obter_chave_ordenacao(sort_by_order_str: str) -> Tuple[Callable[[Dict[str, A
     return chave_final, reverse
 
 
+def obter_ordenacao(sort_by: Optional[str]) -> List[Tuple[str, bool]]:
+    """
+    Interpreta sort_by com uma ou mais chaves separadas por ';'
+    (ex: 'orgao,asc;data_inicio,desc'). Chaves inválidas ou repetidas são ignoradas.
+    """
+    ordenacao = []
+    for parte in (sort_by or "").split(";"):
+        chave, reverse = obter_chave_ordenacao(parte)
+        if chave is not None and chave not in [c for c, _ in ordenacao]:
+            ordenacao.append((chave, reverse))
+    return ordenacao
+
+
+def ordenacao_sql(coluna, reverse: bool):
+    """
+    ORDER BY com NULL tratado como o menor valor: primeiro em ordem crescente,
+    por último em ordem decrescente.
+    """
+    if reverse:
+        return nulls_last(coluna.desc())
+    return nulls_first(coluna.asc())
+
+
+def montar_ordenacao(tipo: str, ordenacao: List[Tuple[str, bool]]):
+    """
+    Separa a ordenação em duas listas de (chave, coluna, reverse):
+    - a dos grupos (ou linhas, no modo flat), terminando no identificador do grupo;
+    - a das linhas dentro de cada grupo, terminando em id_ocupacao.
+    A concatenação das duas é o ORDER BY completo e mantém cada grupo contíguo.
+    """
+    coluna_id = CHAVES_GRUPO[tipo]
+
+    ordem_grupos = [(chave, COLUNAS_ORDENAVEIS[chave], reverse)
+                    for chave, reverse in ordenacao if chave in CHAVES_DO_GRUPO[tipo]]
+    ordem_grupos.append((None, coluna_id, False))
+
+    if tipo == "flat":
+        return ordem_grupos, []
+
+    ordem_linhas = [(chave, COLUNAS_ORDENAVEIS[chave], reverse)
+                    for chave, reverse in ordenacao if chave not in CHAVES_DO_GRUPO[tipo]]
+    ordem_linhas.append((None, Ocupacao.id_ocupacao, False))
+
+    return ordem_grupos, ordem_linhas
+
+
 def aplicar_filtros(query, busca, ativo, mandato, tipo):
     filtro = parse_filtro(busca, tipo) if busca else None
     where_clause = traduzir_parsing_result(filtro) if filtro else None
@@ -153,16 +228,257 @@ def aplicar_filtros(query, busca, ativo, mandato, tipo):
 
 
 
-def montar_query(tipo, busca, ativo, mandato):
+def montar_query(tipo, busca, ativo, mandato, categoria=None):
+    """
+    `categoria` é o tipo usado para interpretar os termos sem campo da busca
+    (por padrão o próprio `tipo`); permite montar linhas flat filtradas como outro tipo.
+    """
     if tipo not in QUERY_BASE:
         raise ValueError("Tipo inválido")
 
+    categoria = categoria or tipo
     query = QUERY_BASE[tipo]()
-    query = aplicar_filtros(query, busca, ativo, mandato, tipo if tipo != "flat" else "pessoa")
+    query = aplicar_filtros(query, busca, ativo, mandato, categoria if categoria != "flat" else "pessoa")
 
     return query
 
 
+# Desempacotamento padronizado das linhas (total de 11 colunas)
+# Campos: 0:nome_pessoa, 1:nome_cargo, 2:nome_orgao, 3:data_inicio, 4:data_fim, 
+#         5:mandato, 6:observacoes, 7:substituto_para, 8:id_ocupacao, 9:exclusivo, 10:id_cargo
+
+def _linha_pessoa(r):
+    return {
+        "cargo": r[1], "orgao": r[2], "data_inicio": r[3], "data_fim": r[4], 
+        "mandato": r[5], "observacoes": r[6], "substituto_para": r[7], 
+        "id_ocupacao": r[8], "exclusivo": r[9], "id_cargo": r[10]
+    }
+
+def _linha_orgao(r):
+    return {
+        "cargo": r[1], "pessoa": r[0], "data_inicio": r[3], "data_fim": r[4], 
+        "mandato": r[5], "observacoes": r[6], "substituto_para": r[7], 
+        "id_ocupacao": r[8], "exclusivo": r[9], "id_cargo": r[10]
+    }
+
+def _linha_cargo(r):
+    return {
+        "orgao": r[2], "pessoa": r[0], "data_inicio": r[3], "data_fim": r[4], 
+        "mandato": r[5], "observacoes": r[6], "substituto_para": r[7], 
+        "id_ocupacao": r[8], "exclusivo": r[9], "id_cargo": r[10]
+    }
+
+def _linha_flat(r):
+    return {
+        "pessoa": r[0], "cargo": r[1], "orgao": r[2], "data_inicio": r[3], "data_fim": r[4], 
+        "mandato": r[5], "observacoes": r[6], "substituto_para": r[7], 
+        "id_ocupacao": r[8], "exclusivo": r[9], "id_cargo": r[10]
+    }
+
+
+def iterar_resultados(tipo: str, results) -> Iterator[Dict[str, Any]]:
+    """
+    Agrupa em uma única passada as linhas de uma query já ordenada por grupo
+    (ver montar_ordenacao), gerando um grupo (ou uma linha, no modo flat) por vez.
+    """
+    if tipo == "pessoa":
+        for nome, linhas in groupby(results, key=itemgetter(0)):
+            yield {"pessoa": nome, "cargos": [_linha_pessoa(r) for r in linhas]}
+
+    elif tipo == "orgao":
+        for nome, linhas in groupby(results, key=itemgetter(2)):
+            yield {"orgao": nome, "cargos": [_linha_orgao(r) for r in linhas]}
+
+    elif tipo == "cargo":
+        for (cargo, orgao), linhas in groupby(results, key=itemgetter(1, 2)):
+            yield {"cargo": cargo, "orgao": orgao, "ocupacoes": [_linha_cargo(r) for r in linhas]}
+
+    elif tipo == "flat":
+        for r in results:
+            yield _linha_flat(r)
+
+
+def _depois_de(coluna, reverse: bool, valor):
+    if valor is None:
+        # Em ordem crescente NULL vem primeiro; em decrescente, por último
+        return false() if reverse else coluna.is_not(None)
+    valor = literal(valor, coluna.type)
+    if reverse:
+        return or_(coluna < valor, coluna.is_(None))
+    return coluna > valor
+
+
+def _igual_a(coluna, valor):
+    return coluna.is_(None) if valor is None else coluna == valor
+
+
+def condicao_keyset(colunas: List[Tuple[Any, Any, bool]], valores: List[Any]):
+    """
+    Condição "vem depois de `valores`" para a ordenação lexicográfica `colunas`
+    (lista de (chave, coluna, reverse)), respeitando a posição dos NULLs.
+    """
+    condicoes = []
+    for i, (_, coluna, reverse) in enumerate(colunas):
+        iguais = [_igual_a(c, v) for (_, c, _), v in zip(colunas[:i], valores[:i])]
+        condicoes.append(and_(*iguais, _depois_de(coluna, reverse, valores[i])))
+    return or_(*condicoes)
+
+
+def codificar_cursor(valores: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(valores, default=str).encode()).decode()
+
+
+def decodificar_cursor(cursor: str, colunas: List[Tuple[Any, Any, bool]]) -> List[Any]:
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        # O último valor é sempre o identificador (inteiro) da unidade
+        if not isinstance(valores, list) or len(valores) != len(colunas) or not isinstance(valores[-1], int):
+            raise ValueError
+        return [
+            date.fromisoformat(v) if v is not None and isinstance(c.type, Date) else v
+            for (_, c, _), v in zip(colunas, valores)
+        ]
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+
+def montar_query_ordenada(tipo, busca, ativo, mandato, sort_by, categoria=None):
+    """
+    Query filtrada e ordenada de forma que cada grupo venha contíguo
+    (pronta para iterar_resultados).
+    """
+    query = montar_query(tipo, busca, ativo, mandato, categoria)
+    ordem_grupos, ordem_linhas = montar_ordenacao(tipo, obter_ordenacao(sort_by))
+    return query.order_by(*[ordenacao_sql(c, r) for _, c, r in ordem_grupos + ordem_linhas])
+
+
+TAMANHO_LOTE_STREAM = 1000
+
+
+def iterar_linhas_stream(query) -> Iterator[Tuple]:
+    """
+    Executa a query com cursor do lado do servidor (yield_per) e gera as
+    linhas conforme chegam, sem carregar o resultado inteiro em memória.
+    Usa uma sessão própria, pois a iteração acontece durante o envio da resposta.
+    """
+    with Session(engine) as session:
+        yield from session.exec(query.execution_options(yield_per=TAMANHO_LOTE_STREAM))
+
+
+def iterar_busca_stream(query, tipo: str) -> Iterator[Dict[str, Any]]:
+    """Versão em streaming de iterar_resultados (grupos/linhas conforme chegam do banco)."""
+    yield from iterar_resultados(tipo, iterar_linhas_stream(query))
+
+
+def gerar_ndjson(itens: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    for item in itens:
+        yield json.dumps(item, default=str, ensure_ascii=False) + "\n"
+
+
+# Colunas da query rotuladas com as chaves usadas no JSON de resposta
+COLUNAS_JSON = {
+    "pessoa": Pessoa.nome,
+    "cargo": Cargo.nome,
+    "orgao": Orgao.nome,
+    "data_inicio": Ocupacao.data_inicio,
+    "data_fim": Ocupacao.data_fim,
+    "mandato": Ocupacao.mandato,
+    "observacoes": Ocupacao.observacoes,
+    "substituto_para": Cargo.substituto_para,
+    "id_ocupacao": Ocupacao.id_ocupacao,
+    "exclusivo": Cargo.exclusivo,
+    "id_cargo": Cargo.id_cargo,
+}
+
+# Formato de cada modo: (campos do grupo, nome da lista, campos de cada item da lista),
+# na mesma ordem de chaves gerada por iterar_resultados
+FORMATO_JSON = {
+    "pessoa": (["pessoa"], "cargos", ["cargo", "orgao", "data_inicio", "data_fim", "mandato", "observacoes",
+                                      "substituto_para", "id_ocupacao", "exclusivo", "id_cargo"]),
+    "orgao": (["orgao"], "cargos", ["cargo", "pessoa", "data_inicio", "data_fim", "mandato", "observacoes",
+                                    "substituto_para", "id_ocupacao", "exclusivo", "id_cargo"]),
+    "cargo": (["cargo", "orgao"], "ocupacoes", ["orgao", "pessoa", "data_inicio", "data_fim", "mandato", "observacoes",
+                                                "substituto_para", "id_ocupacao", "exclusivo", "id_cargo"]),
+    "flat": ([], None, ["pessoa", "cargo", "orgao", "data_inicio", "data_fim", "mandato", "observacoes",
+                        "substituto_para", "id_ocupacao", "exclusivo", "id_cargo"]),
+}
+
+
+def _json_objeto(tabela, campos, *extras):
+    pares = []
+    for campo in campos:
+        pares += [literal_column(f"'{campo}'"), tabela.c[campo]]
+    return func.json_build_object(*pares, *extras)
+
+
+def montar_query_json(tipo, busca, ativo, mandato, sort_by):
+    """
+    Monta uma query que devolve o documento JSON final (mesmo formato de
+    core_busca_generica) já serializado pelo PostgreSQL, como texto.
+    """
+    campos_grupo, nome_lista, campos_item = FORMATO_JSON[tipo]
+    ordem_grupos, ordem_linhas = montar_ordenacao(tipo, obter_ordenacao(sort_by))
+    ordem = [ordenacao_sql(c, r) for _, c, r in ordem_grupos + ordem_linhas]
+
+    # Linhas filtradas, numeradas na ordem final do resultado
+    linhas = montar_query(tipo, busca, ativo, mandato).with_only_columns(
+        *[coluna.label(chave) for chave, coluna in COLUNAS_JSON.items()],
+        CHAVES_GRUPO[tipo].label("id_grupo"),
+        func.row_number().over(order_by=ordem).label("ordem"),
+    ).subquery("linhas")
+
+    if tipo == "flat":
+        documento = func.json_agg(aggregate_order_by(_json_objeto(linhas, campos_item), linhas.c.ordem))
+    else:
+        itens = func.json_agg(aggregate_order_by(_json_objeto(linhas, campos_item), linhas.c.ordem))
+        grupos = (
+            select(
+                _json_objeto(linhas, campos_grupo, literal_column(f"'{nome_lista}'"), itens).label("grupo"),
+                func.min(linhas.c.ordem).label("ordem"),
+            )
+            .group_by(linhas.c.id_grupo, *[linhas.c[campo] for campo in campos_grupo])
+            .subquery("grupos")
+        )
+        documento = func.json_agg(aggregate_order_by(grupos.c.grupo, grupos.c.ordem))
+
+    # cast para texto: evita que o driver converta o JSON de volta em objetos Python
+    return select(cast(func.coalesce(documento, literal_column("'[]'::json")), Text))
+
+
+def core_busca_json(
+    session: Session,
+    tipo: str,
+    busca: str = "",
+    ativo: str = "todos",
+    mandato: str = "todos",
+    sort_by: str = "",
+) -> str:
+    """
+    Caminho rápido da busca: o agrupamento e a serialização são feitos pelo
+    PostgreSQL (json_agg/json_build_object) e o texto é devolvido sem montar dicts.
+    """
+    try:
+        if tipo not in QUERY_BASE:
+            raise ValueError("Tipo inválido")
+        return session.exec(montar_query_json(tipo, busca, ativo, mandato, sort_by)).one()[0]
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Resultados de core_busca_generica e das facetas, invalidados pelo validador das tabelas
+CACHE_BUSCA = CacheVersionado(capacidade=128)
+
+
+def versao_busca(session: Session) -> str:
+    """
+    Versão dos dados da busca: o mesmo validador do ETag (count e max(updated_at) das
+    quatro tabelas), lido do banco, de modo que escritas de qualquer processo
+    (ex.: scripts/recalcular_mandatos.py) invalidam o cache.
+    """
+    return calcular_validador(session, Pessoa, Orgao, Cargo, Ocupacao)
+
+
 # Busca agrupada por pessoa
 def core_busca_generica(
     session: Session,
@@ -171,99 +487,95 @@ def core_busca_generica(
     ativo: str = "todos",
     mandato: str = "todos",
     sort_by: str = "",
+    versao: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
-    Executa a busca, agrupa e ordena os resultados em memória,
-    pronto para ser consumido por endpoints ou serviços internos.
+    Executa a busca já ordenada pelo banco e agrupa os resultados em uma
+    única passada, pronto para ser consumido por endpoints ou serviços internos.
+    Os resultados ficam em CACHE_BUSCA até a próxima escrita (ou até a meia-noite).
+    `versao` é o validador já calculado pelo endpoint (ETag); sem ele, é lido do banco.
+    """
+    def executar():
+        # 1. MONTAGEM DA QUERY SQL (filtros + ORDER BY a partir de sort_by)
+        query = montar_query_ordenada(tipo, busca, ativo, mandato, sort_by)
+
+        # 2. EXECUÇÃO E AGRUPAMENTO (os grupos chegam contíguos do banco)
+        return list(iterar_resultados(tipo, session.exec(query)))
+
+    try:
+        return CACHE_BUSCA.obter(
+            (tipo, busca, ativo, mandato, sort_by or ""), versao or versao_busca(session), executar
+        )
+
+    except Exception as e:
+        # Captura erros de montagem de query, execução ou processamento.
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def core_busca_paginada(
+    session: Session,
+    tipo: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    busca: str = "",
+    ativo: str = "todos",
+    mandato: str = "todos",
+    sort_by: str = "",
+) -> Dict[str, Any]:
+    """
+    Versão paginada (keyset) da busca. A paginação é feita no banco: no modo
+    flat cada página tem até `limit` linhas; nos modos agrupados, até `limit`
+    grupos completos (um grupo nunca é dividido entre páginas).
     """
     try:
-        # 1. MONTAGEM DA QUERY SQL
-        # Esta função não deve mais chamar aplicar_ordenacao no SQLAlchemy.
         query = montar_query(tipo, busca, ativo, mandato)
+        ordem_grupos, ordem_linhas = montar_ordenacao(tipo, obter_ordenacao(sort_by))
+        ordem = [ordenacao_sql(c, r) for _, c, r in ordem_grupos + ordem_linhas]
 
-        # 2. EXECUÇÃO DA QUERY
-        results = session.exec(query).all()
+        if tipo == "flat":
+            pagina = query
+            if cursor:
+                pagina = pagina.where(condicao_keyset(ordem_grupos, decodificar_cursor(cursor, ordem_grupos)))
+            # Busca uma linha a mais só para saber se existe próxima página
+            results = session.exec(pagina.order_by(*ordem).limit(limit + 1)).all()
+
+            resultados = list(iterar_resultados(tipo, results[:limit]))
+            proximo_cursor = None
+            if len(results) > limit:
+                ultima = resultados[-1]
+                proximo_cursor = codificar_cursor(
+                    [ultima[chave] for chave, _, _ in ordem_grupos[:-1]] + [ultima["id_ocupacao"]]
+                )
 
-        # 3. PRÉ-PROCESSAMENTO DA ORDENAÇÃO
-        if sort_by:
-            sort_key, reverse_order = obter_chave_ordenacao(sort_by)
         else:
-            sort_key, reverse_order = None, False
-
-
-        agrupado = defaultdict(list)
-        resultados_agrupados = []
-
-        # Desempacotamento padronizado para o loop (total de 10 colunas)
-        # Campos: 0:nome_pessoa, 1:nome_cargo, 2:nome_orgao, 3:data_inicio, 4:data_fim, 
-        #         5:mandato, 6:observacoes, 7:substituto_para, 8:id_ocupacao, 9:exclusivo
-
-        if tipo == "pessoa":
-            for r in results:
-                nome = r[0]
-                agrupado[nome].append({
-                    "cargo": r[1], "orgao": r[2], "data_inicio": r[3], "data_fim": r[4], 
-                    "mandato": r[5], "observacoes": r[6], "substituto_para": r[7], 
-                    "id_ocupacao": r[8], "exclusivo": r[9], "id_cargo": r[10]
-                })
-            resultados_agrupados = [{"pessoa": nome, "cargos": cargos or []} 
-                                    for nome, cargos in agrupado.items()]
-
-        elif tipo == "orgao":
-            for r in results:
-                orgao_nome = r[2]
-                agrupado[orgao_nome].append({
-                    "cargo": r[1], "pessoa": r[0], "data_inicio": r[3], "data_fim": r[4], 
-                    "mandato": r[5], "observacoes": r[6], "substituto_para": r[7], 
-                    "id_ocupacao": r[8], "exclusivo": r[9], "id_cargo": r[10]
-                })
-            resultados_agrupados = [{"orgao": nome, "cargos": cargos or []} 
-                                    for nome, cargos in agrupado.items()]
-
-        elif tipo == "cargo":
-            for r in results:
-                chave = (r[1], r[2]) # (cargo, orgao)
-                agrupado[chave].append({
-                    "orgao": r[2], "pessoa": r[0], "data_inicio": r[3], "data_fim": r[4], 
-                    "mandato": r[5], "observacoes": r[6], "substituto_para": r[7], 
-                    "id_ocupacao": r[8], "exclusivo": r[9], "id_cargo": r[10]
-                })
-            resultados_agrupados = [{"cargo": cargo, "orgao": orgao, "ocupacoes": cargos or []} 
-                                    for (cargo, orgao), cargos in agrupado.items()]
-
-        elif tipo == "flat":
-            resultados_agrupados = [{
-                "pessoa": r[0], "cargo": r[1], "orgao": r[2], "data_inicio": r[3], "data_fim": r[4], 
-                "mandato": r[5], "observacoes": r[6], "substituto_para": r[7], 
-                "id_ocupacao": r[8], "exclusivo": r[9], "id_cargo": r[10]
-            } for r in results]
-
-        # 4. ORDENAÇÃO EM MEMÓRIA
-
-        if sort_key is None:
-            return resultados_agrupados
-        
-        
-        if sort_key == tipo:
-            resultados_agrupados = sorted(resultados_agrupados, key= lambda x: safe_key(x[sort_key]), reverse=reverse_order)
-            return resultados_agrupados
-        
-        if tipo == "flat":
-            resultados_agrupados = sorted(resultados_agrupados, key= lambda x: safe_key(x[sort_key]), reverse=reverse_order)
-            return resultados_agrupados
-        
-        # Vamos ordenar em cada grupo
-        for linha in resultados_agrupados:
-            if "cargos" in linha:
-                linha["cargos"] = sorted(linha["cargos"], key= lambda x: safe_key(x[sort_key]), reverse=reverse_order)
-            elif "ocupacoes" in linha:
-                linha["ocupacoes"] = sorted(linha["ocupacoes"], key= lambda x: safe_key(x[sort_key]), reverse=reverse_order)
-        
-        return resultados_agrupados
-        
-        
+            # 1. Seleciona as chaves dos grupos da página
+            chaves = query.with_only_columns(*[c for _, c, _ in ordem_grupos]).distinct()
+            if cursor:
+                chaves = chaves.where(condicao_keyset(ordem_grupos, decodificar_cursor(cursor, ordem_grupos)))
+            chaves = session.exec(
+                chaves.order_by(*[ordenacao_sql(c, r) for _, c, r in ordem_grupos]).limit(limit + 1)
+            ).all()
+
+            pagina = chaves[:limit]
+            ids = [chave[-1] for chave in pagina]
+            coluna_id = ordem_grupos[-1][1]
+
+            # 2. Busca todas as linhas desses grupos, já na ordem da página
+            results = session.exec(query.where(coluna_id.in_(ids)).order_by(*ordem)) if ids else []
+
+            resultados = list(iterar_resultados(tipo, results))
+            proximo_cursor = codificar_cursor(list(pagina[-1])) if len(chaves) > limit else None
+
+        return {
+            "limite": limit,
+            "cursor": cursor,
+            "proximo_cursor": proximo_cursor,
+            "resultados": resultados,
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
-        # Captura erros de montagem de query, execução ou processamento.
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -271,15 +583,145 @@ def core_busca_generica(
 # ENDPOINT BUSCA GENÉRICA (SIMPLIFICADO)
 # =========================================================================
 
+# Faixas de vigência, com as mesmas regras do filtro `mandato` em aplicar_filtros.
+# Os rótulos são literais no SQL (sem bind params) para que a expressão do SELECT
+# seja idêntica à do GROUP BY.
+FAIXA_VIGENCIA = case(
+    (Ocupacao.data_inicio > func.current_date(), literal_column("'futuro'")),
+    (Ocupacao.data_fim < func.current_date(), literal_column("'encerrado'")),
+    else_=literal_column("'vigente'")
+)
+
+
+def montar_query_facetas(tipo, busca, ativo, mandato):
+    """
+    Contagens de ocupações por órgão, por cargo, por faixa de vigência e total,
+    numa única agregação com GROUPING SETS sobre a mesma query (filtros e joins) da busca.
+    """
+    query = montar_query(tipo, busca, ativo, mandato)
+
+    return (
+        query
+        .with_only_columns(
+            func.grouping(Orgao.id_orgao),
+            func.grouping(Cargo.id_cargo),
+            func.grouping(FAIXA_VIGENCIA),
+            Orgao.id_orgao, Orgao.nome,
+            Cargo.id_cargo, Cargo.nome,
+            FAIXA_VIGENCIA,
+            func.count(),
+            maintain_column_froms=True
+        )
+        .where(Ocupacao.id_ocupacao != None)
+        .group_by(func.grouping_sets(
+            tuple_(Orgao.id_orgao, Orgao.nome),
+            tuple_(Cargo.id_cargo, Cargo.nome, Orgao.nome),
+            FAIXA_VIGENCIA,
+            tuple_()
+        ))
+    )
+
+
+def core_busca_facetas(
+    session: Session,
+    tipo: str = "pessoa",
+    busca: str = "",
+    ativo: str = "todos",
+    mandato: str = "todos",
+    versao: Optional[str] = None,
+) -> Dict[str, Any]:
+    def executar():
+        facetas = {
+            "total": 0,
+            "orgao": [],
+            "cargo": [],
+            "vigencia": {"vigente": 0, "encerrado": 0, "futuro": 0},
+        }
+
+        linhas = session.exec(montar_query_facetas(tipo, busca, ativo, mandato))
+        for g_orgao, g_cargo, g_vigencia, id_orgao, orgao, id_cargo, cargo, faixa, total in linhas:
+            if not g_orgao and g_cargo:
+                facetas["orgao"].append({"id_orgao": id_orgao, "orgao": orgao, "total": total})
+            elif not g_cargo:
+                facetas["cargo"].append({"id_cargo": id_cargo, "cargo": cargo, "orgao": orgao, "total": total})
+            elif not g_vigencia:
+                facetas["vigencia"][faixa] = total
+            else:
+                facetas["total"] = total
+
+        facetas["orgao"].sort(key=lambda f: (-f["total"], f["orgao"] or ""))
+        facetas["cargo"].sort(key=lambda f: (-f["total"], f["cargo"] or "", f["orgao"] or ""))
+        return facetas
+
+    try:
+        return CACHE_BUSCA.obter(
+            ("facetas", tipo, busca, ativo, mandato), versao or versao_busca(session), executar
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/busca/")
 def busca_generica(
+    request: Request,
+    response: Response,
     busca: str = Query("", description="Prefixo para busca"),
     ativo: str = Query("todos", description="Filtra por ativo/inativo"),
     mandato: str = Query("todos", description="Filtra por vigência de mandato ('vigente', 'encerrado', 'futuro', 'todos')"),
     session: Session = Depends(get_session),
     tipo: str = Query("pessoa", description="Tipo de busca"),
-    sort_by: str = Query(None, description="Campo para ordenar (ex: 'nome,asc')"),
+    sort_by: str = Query(None, description="Campo(s) para ordenar (ex: 'nome,asc' ou 'orgao,asc;data_inicio,desc')"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Tamanho da página (linhas no modo flat, grupos nos demais). Sem limit, retorna tudo."),
+    cursor: Optional[str] = Query(None, description="Cursor opaco retornado em 'proximo_cursor' da página anterior"),
+    json_banco: bool = Query(False, description="Se 'true', o JSON é montado diretamente pelo PostgreSQL (ignorado quando há limit)"),
+    formato: str = Query("json", alias="format", description="'json' (padrão) ou 'ndjson' (um grupo/linha por linha, enviado em streaming)"),
 ):
+    # A busca cruza as quatro tabelas e os filtros de mandato dependem da data atual
+    nao_modificado = resposta_condicional(
+        request, response, session, Pessoa, Orgao, Cargo, Ocupacao, depende_da_data=True
+    )
+    if nao_modificado:
+        return nao_modificado
+
+    if formato == "ndjson":
+        try:
+            query = montar_query_ordenada(tipo, busca, ativo, mandato, sort_by)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        return StreamingResponse(
+            gerar_ndjson(iterar_busca_stream(query, tipo)),
+            media_type="application/x-ndjson",
+            headers=dict(response.headers)
+        )
+
+    if limit is not None:
+        return core_busca_paginada(
+            session=session,
+            tipo=tipo,
+            limit=limit,
+            cursor=cursor,
+            busca=busca,
+            ativo=ativo,
+            mandato=mandato,
+            sort_by=sort_by
+        )
+
+    if json_banco:
+        return Response(
+            content=core_busca_json(
+                session=session,
+                tipo=tipo,
+                busca=busca,
+                ativo=ativo,
+                mandato=mandato,
+                sort_by=sort_by
+            ),
+            media_type="application/json",
+            headers=dict(response.headers)
+        )
+
     # Chama a função core, transferindo a lógica para ela.
     return core_busca_generica(
         session=session,
@@ -287,5 +729,34 @@ def busca_generica(
         busca=busca,
         ativo=ativo,
         mandato=mandato,
-        sort_by=sort_by
+        sort_by=sort_by,
+        # O ETag já é o validador das quatro tabelas: evita recalculá-lo no cache
+        versao=response.headers["ETag"]
     )
+
+
+@router.get("/busca/facetas")
+def busca_facetas(
+    request: Request,
+    response: Response,
+    busca: str = Query("", description="Mesmo filtro de /api/busca/"),
+    ativo: str = Query("todos", description="Filtra por ativo/inativo"),
+    mandato: str = Query("todos", description="Filtra por vigência de mandato ('vigente', 'encerrado', 'futuro', 'todos')"),
+    tipo: str = Query("pessoa", description="Tipo de busca (define a categoria padrão dos termos sem campo)"),
+    session: Session = Depends(get_session),
+):
+    nao_modificado = resposta_condicional(
+        request, response, session, Pessoa, Orgao, Cargo, Ocupacao, depende_da_data=True
+    )
+    if nao_modificado:
+        return nao_modificado
+
+    return core_busca_facetas(
+        session=session, tipo=tipo, busca=busca, ativo=ativo, mandato=mandato,
+        versao=response.headers["ETag"]
+    )
+
+
+@router.get("/busca/cache")
+def estatisticas_cache_busca():
+    return CACHE_BUSCA.estatisticas()
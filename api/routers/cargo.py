@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
 from sqlalchemy import update
 from sqlalchemy.exc import IntegrityError
 from sqlmodel import SQLModel, Session, delete, select
@@ -9,7 +9,9 @@ from utils.history_log import add_to_log
 from models.cargo import Cargo
 from models.orgao import Orgao
 from models.ocupacao import Ocupacao
+from utils.cadeia_substituicao import cadeia_abaixo, cadeia_acima
 from utils.enums import TipoOperacao, EntidadeAlvo
+from utils.etag import resposta_condicional
 from database import get_session
 
 
@@ -89,16 +91,11 @@ def core_adicionar_cargo(
     # ------------------------------------------
     # 4. Verificação de ciclo
     # ------------------------------------------
-    atual = acima
-    while atual is not None:
-        if atual.id_cargo == novo.id_cargo:
-            raise HTTPException(
-                400,
-                "Ciclo detectado na cadeia de substituição."
-            )
-        atual = (
-            session.get(Cargo, atual.substituto_para)
-            if atual.substituto_para else None
+    ids_acima = [acima.id_cargo] + [c.id_cargo for c in cadeia_acima(session, acima.id_cargo)]
+    if novo.id_cargo in ids_acima:
+        raise HTTPException(
+            400,
+            "Ciclo detectado na cadeia de substituição."
         )
 
     # ------------------------------------------
@@ -146,27 +143,13 @@ def coletar_cadeia_abaixo(session: Session, cargo: Cargo, hard_delete: bool) ->
     Retorna lista de cargos na cadeia *abaixo* do cargo (substitutos diretos e recursivos),
     na ordem imediata: [sub1, sub2, ...].
     """
-    cadeia = []
-    visitado = set()
-    atual = cargo
-
-    while atual and atual.substituto:
-        proximo_id = atual.substituto
-        if proximo_id in visitado:
-            # proteção contra ciclo (não deveria ocorrer, mas por segurança)
-            break
-        visitado.add(proximo_id)
-        proximo = session.get(Cargo, proximo_id)
+    cadeia = cadeia_abaixo(session, cargo.id_cargo)
 
-        # Se a operação for um hard delete, vai preparando para deleção removendo a referência do substituto para não violar FK
-        if hard_delete:
+    # Se a operação for um hard delete, vai preparando para deleção removendo a referência do substituto para não violar FK
+    if hard_delete:
+        for atual in [cargo] + cadeia[:-1]:
             atual.substituto = None
 
-        if not proximo:
-            break
-        cadeia.append(proximo)
-        atual = proximo
-
     return cadeia
 
 def remover_cargo(
@@ -286,10 +269,8 @@ def reativar_cargo(
     
     afetados = [cargo.id_cargo]
 
-    id_acima = cargo.substituto_para
-
-    while id_acima:
-        cargo_acima = session.get(Cargo, id_acima)
+    # Reativa os cargos acima até o primeiro que já estiver ativo
+    for cargo_acima in cadeia_acima(session, cargo.id_cargo):
         if cargo_acima.ativo == False:
             cargo_acima.ativo = True
             afetados.append(cargo_acima.id_cargo)
@@ -302,8 +283,6 @@ def reativar_cargo(
                 entidade_alvo=EntidadeAlvo.CARGO,
                 operation=f"[REATIVAÇÃO] O cargo {cargo_acima.nome}, do órgão {orgao_acima.nome}, foi reativado(a)"
             )
-            
-            id_acima = cargo_acima.substituto_para
         else: 
             break
 
@@ -422,8 +401,13 @@ def adicionar_cargos_lote(cargos: List[CargoCreate], session: Session = Depends(
 
 
 @router.get("/", response_model=List[dict])
-def carregar_cargo(session: Session = Depends(get_session)):
+def carregar_cargo(request: Request, response: Response, session: Session = Depends(get_session)):
     try:
+        # A listagem inclui o nome do órgão, então depende das duas tabelas
+        nao_modificado = resposta_condicional(request, response, session, Cargo, Orgao)
+        if nao_modificado:
+            return nao_modificado
+
         dados = session.exec(select(Cargo, Orgao.nome).join(Orgao, Cargo.id_orgao == Orgao.id_orgao)).all()
 
         # Monta o retorno com o nome do órgão
@@ -1,13 +1,20 @@
 from datetime import date
-from fastapi import APIRouter, Depends, Query
-from sqlmodel import Session, and_, select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session, SQLModel, func, select
+from typing import List, Optional
 
-from routers.ocupacao import _get_next_occupacao, _get_prev_occupacao
 from models.cargo import Cargo
-from models.ocupacao import Ocupacao
 from models.pessoa import Pessoa
+from routers.busca import codificar_cursor, condicao_keyset, decodificar_cursor
+from utils.linha_do_tempo import CACHE_LINHAS_DO_TEMPO
 from database import get_session
 
+class MatrizElegibilidadeRequest(SQLModel):
+    ids_pessoas: List[int]
+    ids_cargos: List[int]
+    data_inicio: date
+
+
 class RegraViolada:
     OCUPACAO_EXISTENTE = 1
     TERCEIRO_MANDATO = 2
@@ -36,22 +43,25 @@ router = APIRouter(
 )
 
 
-def verificar_regra_cargo_exclusivo(session: Session, id_cargo: int, data_inicio):
-    cargo = session.get(Cargo, id_cargo)
-    if not cargo or not cargo.exclusivo:
+def _ocupacao_conflitante(linha_do_tempo, data_inicio):
+    """Regra 1 sobre a linha do tempo do cargo: ocupação que impede uma nova em data_inicio."""
+    if linha_do_tempo is None or not linha_do_tempo.exclusivo:
         return None   # regra não se aplica
 
     data_inicio_nova = data_inicio or date.min
 
-    ocupacao_existente = session.exec(
-        select(Ocupacao).where(
-            and_(
-                Ocupacao.id_cargo == id_cargo,
-                ((Ocupacao.data_inicio == None)),
-                ((Ocupacao.data_fim == None) | (Ocupacao.data_fim >= data_inicio_nova)),
-            )
-        )
-    ).first()
+    return next(
+        (
+            o for o in linha_do_tempo.sem_data_inicio()
+            if o.data_fim is None or o.data_fim >= data_inicio_nova
+        ),
+        None
+    )
+
+
+def verificar_regra_cargo_exclusivo(session: Session, id_cargo: int, data_inicio):
+    linha_do_tempo = CACHE_LINHAS_DO_TEMPO.obter(session, id_cargo)
+    ocupacao_existente = _ocupacao_conflitante(linha_do_tempo, data_inicio)
 
     if ocupacao_existente:
         pessoa = session.get(Pessoa, ocupacao_existente.id_pessoa)
@@ -68,22 +78,8 @@ def verificar_regra_cargo_exclusivo(session: Session, id_cargo: int, data_inicio
 
 def verificar_regra_terceiro_mandato(session: Session, id_pessoa, id_cargo, data_inicio):
 
-    anterior = _get_prev_occupacao(session, id_cargo, data_inicio or date.min)
-    proxima = _get_next_occupacao(session, id_cargo, data_inicio or date.min)
-
-    num_seguidos = 1
-
-    if anterior and anterior.id_pessoa == id_pessoa:
-        num_seguidos = (anterior.mandato or 0) + 1
-
-    contador = num_seguidos
-    atual = proxima
-
-    while atual and atual.id_pessoa == id_pessoa:
-        contador += 1
-        atual = _get_next_occupacao(
-            session, atual.id_cargo, atual.data_inicio or date.min, atual.id_ocupacao
-        )
+    linha_do_tempo = CACHE_LINHAS_DO_TEMPO.obter(session, id_cargo)
+    contador = linha_do_tempo.mandatos_seguidos(id_pessoa, data_inicio or date.min) if linha_do_tempo else 1
 
     if contador > 2:
         pessoa = session.get(Pessoa, id_pessoa)
@@ -124,3 +120,143 @@ def verificar_elegibilidade_endpoint(
     
 
 
+@router.post("/matriz")
+def matriz_elegibilidade(
+    payload: MatrizElegibilidadeRequest,
+    session: Session = Depends(get_session)
+):
+    """
+    Elegibilidade de cada pessoa para cada cargo na mesma data, com as regras de
+    verificar_elegibilidade. As linhas do tempo de todos os cargos vêm de uma única
+    carga (ou do cache) e as regras são avaliadas em memória: a regra 1 uma vez por
+    cargo e a regra 2 a partir das sequências vizinhas à data, também por cargo.
+    matriz[i][j] é o resultado de ids_pessoas[i] em ids_cargos[j].
+    """
+    ids_pessoas = list(dict.fromkeys(payload.ids_pessoas))
+    ids_cargos = list(dict.fromkeys(payload.ids_cargos))
+
+    nomes_cargos = dict(session.exec(
+        select(Cargo.id_cargo, Cargo.nome).where(Cargo.id_cargo.in_(ids_cargos))
+    ).all())
+    nomes_pessoas = dict(session.exec(
+        select(Pessoa.id_pessoa, Pessoa.nome).where(Pessoa.id_pessoa.in_(ids_pessoas))
+    ).all())
+
+    faltantes = [i for i in ids_cargos if i not in nomes_cargos]
+    if faltantes:
+        raise HTTPException(404, f"Cargo(s) não encontrado(s): {faltantes}")
+    faltantes = [i for i in ids_pessoas if i not in nomes_pessoas]
+    if faltantes:
+        raise HTTPException(404, f"Pessoa(s) não encontrada(s): {faltantes}")
+
+    linhas_do_tempo = CACHE_LINHAS_DO_TEMPO.obter_varios(session, ids_cargos)
+    data_inicio = payload.data_inicio
+
+    # Por cargo: a ocupação que o bloqueia (regra 1) e quem chegaria ao terceiro mandato (regra 2)
+    conflitantes = {i: _ocupacao_conflitante(linhas_do_tempo[i], data_inicio) for i in ids_cargos}
+    mandatos = {i: linhas_do_tempo[i].mandatos_seguidos_por_pessoa(data_inicio) for i in ids_cargos}
+
+    ocupantes = {o.id_pessoa for o in conflitantes.values() if o is not None} - nomes_pessoas.keys()
+    if ocupantes:
+        nomes_pessoas.update(session.exec(
+            select(Pessoa.id_pessoa, Pessoa.nome).where(Pessoa.id_pessoa.in_(ocupantes))
+        ).all())
+
+    def resultado(id_pessoa: int, id_cargo: int) -> ElegibilidadeResultado:
+        # Regra 1 — cargo ocupado
+        conflitante = conflitantes[id_cargo]
+        if conflitante:
+            return ElegibilidadeResultado(
+                elegivel=False,
+                regra=RegraViolada.OCUPACAO_EXISTENTE,
+                detalhe=f"Cargo já está ocupado por {nomes_pessoas[conflitante.id_pessoa]}.",
+                ocupacao_conflitante=conflitante.id_ocupacao
+            )
+
+        # Regra 2 — terceiro mandato
+        if mandatos[id_cargo].get(id_pessoa, 1) > 2:
+            return ElegibilidadeResultado(
+                elegivel=False,
+                regra=RegraViolada.TERCEIRO_MANDATO,
+                detalhe=f"{nomes_pessoas[id_pessoa]} já possui duas ocupações consecutivas no cargo {nomes_cargos[id_cargo]}.",
+            )
+
+        return ElegibilidadeResultado(elegivel=True)
+
+    return {
+        "data_inicio": data_inicio,
+        "ids_pessoas": ids_pessoas,
+        "ids_cargos": ids_cargos,
+        "matriz": [
+            [
+                {"id_pessoa": id_pessoa, "id_cargo": id_cargo, **resultado(id_pessoa, id_cargo).to_dict()}
+                for id_cargo in ids_cargos
+            ]
+            for id_pessoa in ids_pessoas
+        ]
+    }
+
+
+@router.get("/cargo/{id_cargo}/elegiveis")
+def pessoas_elegiveis_cargo(
+    id_cargo: int,
+    data: date = Query(..., description="Data de início da ocupação"),
+    prefixo: str = Query("", description="Prefixo do nome da pessoa"),
+    limit: int = Query(50, ge=1, le=500, description="Tamanho da página"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco retornado em 'proximo_cursor' da página anterior"),
+    session: Session = Depends(get_session)
+):
+    """
+    Pessoas ativas que poderiam assumir o cargo na data pelas regras 1 e 2, em ordem de nome.
+    A regra 1 não depende da pessoa: se o cargo estiver ocupado, ninguém é elegível e o
+    bloqueio é informado. Pela regra 2, só quem está nas sequências de mandatos vizinhas
+    à data pode chegar ao terceiro mandato; essas pessoas saem da consulta por anti-join.
+    Paginação por keyset (nome, id_pessoa), como na busca.
+    """
+    nome_cargo = session.exec(select(Cargo.nome).where(Cargo.id_cargo == id_cargo)).first()
+    if nome_cargo is None:
+        raise HTTPException(404, "Cargo não encontrado.")
+
+    # Regra 1 — cargo ocupado
+    bloqueio = verificar_regra_cargo_exclusivo(session, id_cargo, data)
+    if bloqueio:
+        return {
+            "id_cargo": id_cargo,
+            "data": data,
+            "bloqueio": bloqueio.to_dict(),
+            "limite": limit,
+            "cursor": cursor,
+            "proximo_cursor": None,
+            "resultados": [],
+        }
+
+    # Regra 2 — terceiro mandato
+    linha_do_tempo = CACHE_LINHAS_DO_TEMPO.obter(session, id_cargo)
+    excluidos = [
+        id_pessoa for id_pessoa, mandatos in linha_do_tempo.mandatos_seguidos_por_pessoa(data).items()
+        if mandatos > 2
+    ]
+
+    query = select(Pessoa.id_pessoa, Pessoa.nome).where(Pessoa.ativo == True)
+    if excluidos:
+        query = query.where(Pessoa.id_pessoa.not_in(excluidos))
+    if prefixo:
+        query = query.where(func.normalizar_nome(Pessoa.nome).startswith(func.normalizar_nome(prefixo)))
+
+    ordem = [("nome", Pessoa.nome, False), ("id_pessoa", Pessoa.id_pessoa, False)]
+    if cursor:
+        query = query.where(condicao_keyset(ordem, decodificar_cursor(cursor, ordem)))
+
+    # Uma linha a mais só para saber se existe próxima página
+    linhas = session.exec(query.order_by(Pessoa.nome, Pessoa.id_pessoa).limit(limit + 1)).all()
+    pagina = linhas[:limit]
+
+    return {
+        "id_cargo": id_cargo,
+        "data": data,
+        "bloqueio": None,
+        "limite": limit,
+        "cursor": cursor,
+        "proximo_cursor": codificar_cursor([pagina[-1].nome, pagina[-1].id_pessoa]) if len(linhas) > limit else None,
+        "resultados": [{"id_pessoa": id_pessoa, "nome": nome} for id_pessoa, nome in pagina],
+    }
@@ -93,7 +93,9 @@ def aprovar_ocupacao(
                     operation=f"[ADD] Adicionada ocupação de {pessoa.nome} no cargo de {cargo.nome}, no órgão {orgao.nome}." 
                 )
 
+                # A remoção precisa chegar ao banco antes da inserção (restrição de exclusão do cargo)
                 session.delete(ocupacao_afetada)
+                session.flush()
                 session.add(nova_entidade)
                 session.commit()
                 session.refresh(nova_entidade)
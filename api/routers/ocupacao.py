@@ -1,16 +1,23 @@
-from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import SQLModel, Session, nulls_first, nullslast, or_, select, and_
+from sqlalchemy import Integer, case, column, insert, text, update, values
+from sqlmodel import SQLModel, Session, and_, func, nulls_first, or_, select
 from typing import List, Optional, Set
 
 from models.notificacoes import Notificacoes
 from utils.history_log import add_to_log
+from utils.cadeia_substituicao import cadeia_abaixo, cte_cadeia
 from utils.enums import EntidadeAlvo, TipoOperacao
+from utils.etag import resposta_condicional
+from utils.linha_do_tempo import CACHE_LINHAS_DO_TEMPO, OcupacaoResumo
 from models.cargo import Cargo 
 from models.ocupacao import Ocupacao
 from models.orgao import Orgao
 from models.pessoa import Pessoa
+from models.role import UserRole
+from routers.security import role_required
 from database import get_session
 
 class FinalizarOcupacaoRequest(SQLModel):
@@ -18,44 +25,98 @@ class FinalizarOcupacaoRequest(SQLModel):
     data_fim: date
     data_inicio_substitutos: Optional[date] = None
     data_fim_substitutos: Optional[date] = None
+
+class AtribuicaoMandato(SQLModel):
+    id_pessoa: int
+    id_cargo: int
+
+class RenovacaoMandatoRequest(SQLModel):
+    data_inicio: date
+    data_fim: Optional[date] = None
+    atribuicoes: List[AtribuicaoMandato]
     
 router = APIRouter(prefix="/api/ocupacao", tags=["Ocupação"])
 
 
-def _get_prev_occupacao(session: Session, id_cargo: int, data_inicio, id_ocupacao: Optional[int] = None):
+# Ordem cronológica das ocupações de um cargo, usada na numeração dos mandatos
+ORDEM_OCUPACOES = (nulls_first(Ocupacao.data_inicio.asc()), Ocupacao.id_ocupacao.asc())
+
+
+def _get_sequencias_adjacentes(session: Session, id_cargo: int, data_inicio, id_ocupacao: Optional[int] = None):
     """
-    Ocupação imediatamente anterior ao ponto data_inicio.
-    Se houver empates em data_inicio, usamos id_ocupacao como tie-breaker (maior id = mais recente).
+    Sequências de mandatos consecutivos (mesma pessoa) em volta do ponto data_inicio,
+    lidas da linha do tempo do cargo em cache (ver utils.linha_do_tempo).
+
+    Retorna (anteriores, posteriores), como OcupacaoResumo:
+    - anteriores: a sequência da ocupação imediatamente anterior ao ponto, até ela
+      (anteriores[-1] é essa ocupação);
+    - posteriores: a sequência da ocupação imediatamente posterior, a partir dela
+      (posteriores[0] é essa ocupação).
+    Se as duas forem da mesma pessoa, são partes da mesma sequência.
+    id_ocupacao, se informado, é desconsiderado (ex.: ocupação sendo removida).
     """
-    stmt = (
-        select(Ocupacao)
-        .where(Ocupacao.id_cargo == id_cargo)
-        .where(or_(Ocupacao.data_inicio <= data_inicio, Ocupacao.data_inicio == None))
-        .where(Ocupacao.id_ocupacao != id_ocupacao if id_ocupacao is not None else True)
-        .order_by(
-            nullslast(Ocupacao.data_inicio.desc()),
-            Ocupacao.id_ocupacao.desc()
-        )
-        .limit(1)
-    )
-    return session.exec(stmt).first()
+    linha_do_tempo = CACHE_LINHAS_DO_TEMPO.obter(session, id_cargo)
+    if linha_do_tempo is None:
+        return [], []
+    return linha_do_tempo.sequencias_adjacentes(data_inicio, id_ocupacao)
 
 
-def _get_next_occupacao(session: Session, id_cargo: int, data_inicio, id_ocupacao: Optional[int] = None):
+# Restrição de exclusão criada por upgrade.sql (ocupações de cargo exclusivo não se sobrepõem)
+RESTRICAO_EXCLUSIVIDADE = "ocupacao_exclusiva_sem_sobreposicao"
+_restricao_exclusividade: Optional[bool] = None
+
+
+def _restricao_exclusividade_ativa(session: Session) -> bool:
     """
-    Ocupação imediatamente posterior ao ponto data_inicio.
+    Indica se a restrição de exclusão existe no banco. upgrade.sql não a cria
+    enquanto houver sobreposições nos dados; como ele só roda na inicialização,
+    a resposta é guardada até o processo reiniciar.
     """
-    stmt = (
-        select(Ocupacao)
-        .where(Ocupacao.id_cargo == id_cargo)
-        .where(Ocupacao.data_inicio >= data_inicio)
-        .where(Ocupacao.id_ocupacao != id_ocupacao if id_ocupacao is not None else True)
-        .order_by(Ocupacao.data_inicio.asc(), Ocupacao.id_ocupacao.asc())
-        .limit(1)
+    global _restricao_exclusividade
+    if _restricao_exclusividade is None:
+        _restricao_exclusividade = session.exec(
+            select(func.count())
+            .select_from(text("pg_constraint"))
+            .where(column("conname") == RESTRICAO_EXCLUSIVIDADE)
+        ).one() > 0
+    return _restricao_exclusividade
+
+
+def _violou_exclusividade(erro: IntegrityError) -> bool:
+    diag = getattr(erro.orig, "diag", None)
+    return (
+        getattr(erro.orig, "pgcode", None) == "23P01"
+        and getattr(diag, "constraint_name", None) == RESTRICAO_EXCLUSIVIDADE
     )
-    return session.exec(stmt).first()
 
 
+def _buscar_ocupacao_sobreposta(session: Session, ocupacao: Ocupacao) -> Optional[OcupacaoResumo]:
+    linha_do_tempo = CACHE_LINHAS_DO_TEMPO.obter(session, ocupacao.id_cargo)
+    if linha_do_tempo is None:
+        return None
+    return linha_do_tempo.primeira_sobreposta(ocupacao.data_inicio, ocupacao.data_fim)
+
+
+def _notificar_sobreposicao(session: Session, ocupacao: Ocupacao, ocupacao_existente: Optional[OcupacaoResumo]):
+    """Regra 1: registra a solicitação de aprovação para a ocupação conflitante e recusa a inserção."""
+    cargo = session.get(Cargo, ocupacao.id_cargo)
+    orgao = session.get(Orgao, cargo.id_orgao)
+    ocupante = session.get(Pessoa, ocupacao_existente.id_pessoa).nome if ocupacao_existente else "outra pessoa"
+    mensagem = f"O cargo {cargo.nome}, do órgão {orgao.nome}, já está ocupado por {ocupante}. Abrindo solicitação de aprovação para esta ocupação."
+
+    solicitacao = Notificacoes(
+        operation=mensagem,
+        tipo_operacao=TipoOperacao.ASSOCIACAO,
+        entidade_alvo=EntidadeAlvo.OCUPACAO,
+        dados_payload=ocupacao.model_dump(mode='json'),
+        id_afetado=ocupacao_existente.id_ocupacao if ocupacao_existente else None,
+        regra=1
+    )
+    session.add(solicitacao)
+    session.commit()
+    session.refresh(solicitacao)
+
+    raise HTTPException(status_code=400, detail=mensagem)
 
 
 def core_adicionar_ocupacao(
@@ -76,62 +137,28 @@ def core_adicionar_ocupacao(
                 )
             
         # === Regra 1: impedir ocupação de cargo exclusivo com sobreposição ===
-        # cargo já carregado acima
-        if cargo and cargo.exclusivo:
-            data_inicio_nova = ocupacao.data_inicio or date.min
-            data_fim_nova = ocupacao.data_fim or date(9999, 12, 31)
-
-            ocupacao_existente = session.exec(
-                select(Ocupacao)
-                .where(
-                    and_(
-                        Ocupacao.id_cargo == ocupacao.id_cargo,
-                        ((Ocupacao.data_inicio <= data_fim_nova) | (Ocupacao.data_inicio == None)),
-                        ((Ocupacao.data_fim == None) | (Ocupacao.data_fim >= data_inicio_nova))
-                    )
-                )
-            ).first()
-
+        # Com a restrição de exclusão no banco, a checagem é a própria inserção (mais abaixo).
+        # Sem ela (dados legados inconsistentes), mantém-se a consulta prévia.
+        if cargo and cargo.exclusivo and not _restricao_exclusividade_ativa(session):
+            ocupacao_existente = _buscar_ocupacao_sobreposta(session, ocupacao)
             if ocupacao_existente:
-                dadospayload = ocupacao.model_dump()
-                cargo = session.get(Cargo, ocupacao.id_cargo)
-                orgao = session.get(Orgao, cargo.id_orgao)
-                pessoa = session.get(Pessoa, ocupacao_existente.id_pessoa)
-                solicitacao = Notificacoes(
-                    operation=f"O cargo {cargo.nome}, do órgão {orgao.nome}, já está ocupado por {pessoa.nome}. Abrindo solicitação de aprovação para esta ocupação.",
-                    tipo_operacao=TipoOperacao.ASSOCIACAO,
-                    entidade_alvo=EntidadeAlvo.OCUPACAO,
-                    dados_payload=dadospayload,
-                    id_afetado=ocupacao_existente.id_ocupacao,
-                    regra=1   
-                )
-                session.add(solicitacao)
-                session.commit()
-                session.refresh(solicitacao)
-
-                raise HTTPException(
-                    status_code=400,
-                    detail=(
-                        f"O cargo {cargo.nome}, do órgão {orgao.nome}, já está ocupado por {pessoa.nome}. Abrindo solicitação de aprovação para esta ocupação."
-                    )
-                )
+                _notificar_sobreposicao(session, ocupacao, ocupacao_existente)
 
         # === Regra 2: impedir 3ª ocupação consecutiva da mesma pessoa ===
     
-        previous_ocupation = _get_prev_occupacao(session, ocupacao.id_cargo, ocupacao.data_inicio or date.min)
-        next_ocupation = _get_next_occupacao(session, ocupacao.id_cargo, ocupacao.data_inicio or date.min)
+        anteriores, posteriores = _get_sequencias_adjacentes(session, ocupacao.id_cargo, ocupacao.data_inicio or date.min)
+        previous_ocupation = anteriores[-1] if anteriores else None
+        next_ocupation = posteriores[0] if posteriores else None
 
         num_mandatos_seguidos = 1
         if previous_ocupation and previous_ocupation.id_pessoa == ocupacao.id_pessoa:
             num_mandatos_seguidos = (previous_ocupation.mandato or 0) + 1
-        
-        contador = num_mandatos_seguidos
-        atual = next_ocupation
-        
+
+        # Mandatos seguintes da mesma pessoa, que passam a continuar a nova sequência
+        sequencia_seguinte = posteriores if next_ocupation and next_ocupation.id_pessoa == ocupacao.id_pessoa else []
+
         # Simula a contagem futura
-        while atual and atual.id_pessoa == ocupacao.id_pessoa:
-            contador += 1
-            atual = _get_next_occupacao(session, atual.id_cargo, atual.data_inicio or date.min, atual.id_ocupacao)
+        contador = num_mandatos_seguidos + len(sequencia_seguinte)
 
         if contador > 2 and not bypass_rules:
             # Se ultrapassar 2 mandatos, cria notificação em vez de apenas bloquear
@@ -159,103 +186,353 @@ def core_adicionar_ocupacao(
                 detail="As últimas duas ocupações do cargo já foram dessa mesma pessoa. Criada uma solicitação de aprovação para esta ocupação."
             )
         
-        # Se não ultrapassou, aplica a atualização dos mandatos seguintes
-        atual = next_ocupation
-        contador_update = num_mandatos_seguidos
-        while atual and atual.id_pessoa == ocupacao.id_pessoa:
-            atual.mandato = contador_update + 1
-            contador_update += 1
-            session.add(atual) # Garante update na sessão
-            # session.flush() # Removido flush excessivo, o commit final resolve
-            atual = _get_next_occupacao(session, atual.id_cargo, atual.data_inicio or date.min, atual.id_ocupacao)
+        # Mudanças desta ocupação num savepoint: se a inserção violar a regra 1,
+        # só elas são desfeitas e o que já estava pendente na sessão é preservado
+        try:
+            with session.begin_nested():
+                # Se não ultrapassou, aplica a atualização dos mandatos seguintes
+                for i, resumo in enumerate(sequencia_seguinte, start=1):
+                    atual = session.get(Ocupacao, resumo.id_ocupacao)
+                    atual.mandato = num_mandatos_seguidos + i
+                    session.add(atual) # Garante update na sessão
         
-        # Checa pela quebra de uma sequência de mandatos
-        if previous_ocupation and next_ocupation and previous_ocupation.id_pessoa == next_ocupation.id_pessoa != ocupacao.id_pessoa:
-            next_ocupation.mandato = next_ocupation.mandato - 1
-            session.add(next_ocupation) # Garante update
-
-            
-        nova_ocupacao = Ocupacao(
-            id_pessoa=ocupacao.id_pessoa,
-            id_cargo=ocupacao.id_cargo,
-            data_inicio=ocupacao.data_inicio,
-            data_fim=ocupacao.data_fim,
-            mandato=num_mandatos_seguidos,
-            observacoes=ocupacao.observacoes,
-        )
+                # Checa pela quebra de uma sequência de mandatos
+                if previous_ocupation and next_ocupation and previous_ocupation.id_pessoa == next_ocupation.id_pessoa != ocupacao.id_pessoa:
+                    seguinte = session.get(Ocupacao, next_ocupation.id_ocupacao)
+                    seguinte.mandato = next_ocupation.mandato - 1
+                    session.add(seguinte) # Garante update
 
-        # Regra 3: Se o cargo é substituto de outro, deve existir uma ocupação com o cargo principal
-        if cargo and cargo.substituto_para is not None:
             
-            if nova_ocupacao.data_inicio is None:
-                raise HTTPException(
-                    400,
-                    "Para cargos substitutos, é obrigatório informar a data de início."
+                nova_ocupacao = Ocupacao(
+                    id_pessoa=ocupacao.id_pessoa,
+                    id_cargo=ocupacao.id_cargo,
+                    data_inicio=ocupacao.data_inicio,
+                    data_fim=ocupacao.data_fim,
+                    mandato=num_mandatos_seguidos,
+                    observacoes=ocupacao.observacoes,
                 )
 
-            data_ref = nova_ocupacao.data_inicio
+                # Regra 3: Se o cargo é substituto de outro, deve existir uma ocupação com o cargo principal
+                if cargo and cargo.substituto_para is not None:
+            
+                    if nova_ocupacao.data_inicio is None:
+                        raise HTTPException(
+                            400,
+                            "Para cargos substitutos, é obrigatório informar a data de início."
+                        )
+
+                    data_ref = nova_ocupacao.data_inicio
+
+                    # Cargo principal
+                    linha_principal = CACHE_LINHAS_DO_TEMPO.obter(session, cargo.substituto_para)
+                    if linha_principal is None:
+                        raise HTTPException(
+                            500,
+                            f"Cargo principal {cargo.substituto_para} não existe."
+                        )
+
+                    if not linha_principal.vigentes_em(data_ref):
+                        raise HTTPException(
+                            400,
+                            (
+                                f"Não é possível criar ocupação para o cargo substituto {cargo.id_cargo}: "
+                                f"não existe ocupação vigente para o cargo principal {linha_principal.id_cargo} "
+                                f"na data {data_ref}."
+                            )
+                        )
+
+                # === Inserção da nova ocupação ===
+                session.add(nova_ocupacao)
+                session.flush()
+        except IntegrityError as e:
+            if not _violou_exclusividade(e):
+                raise
+            # Regra 1 (restrição no banco): a ocupação conflitante só é buscada agora, para a mensagem
+            _notificar_sobreposicao(session, ocupacao, _buscar_ocupacao_sobreposta(session, ocupacao))
 
-            # Cargo principal
-            cargo_principal = session.get(Cargo, cargo.substituto_para)
-            if not cargo_principal:
-                raise HTTPException(
-                    500,
-                    f"Cargo principal {cargo.substituto_para} não existe."
-                )
+        return nova_ocupacao
 
-            ocupacao_principal = session.exec(
-                select(Ocupacao)
-                .where(Ocupacao.id_cargo == cargo_principal.id_cargo)
-                .where(
-                    or_(
-                        Ocupacao.data_inicio <= data_ref,
-                        Ocupacao.data_inicio == None
-                    )
-                )
-                .where(
-                    or_(
-                        Ocupacao.data_fim == None,
-                        Ocupacao.data_fim >= data_ref
-                    )
-                )
-            ).first()
 
-            if not ocupacao_principal:
-                raise HTTPException(
-                    400,
-                    (
-                        f"Não é possível criar ocupação para o cargo substituto {cargo.id_cargo}: "
-                        f"não existe ocupação vigente para o cargo principal {cargo_principal.id_cargo} "
-                        f"na data {data_ref}."
-                    )
-                )
+def _chave_linha_do_tempo(data_inicio, desempate) -> tuple:
+    # Mesma ordem de ORDEM_OCUPACOES; novas ocupações vêm depois das existentes de mesma data
+    return (data_inicio is not None, data_inicio or date.min, desempate)
 
-        # === Inserção da nova ocupação ===
-        session.add(nova_ocupacao)
-        session.flush()
 
-        return nova_ocupacao
+def _renumerar_mandatos(linha_do_tempo: List[dict], inicio: int):
+    """
+    Renumera os mandatos a partir da posição `inicio` (ocupação recém-inserida):
+    o restante da sequência dela e a sequência seguinte, cuja continuidade pode ter mudado.
+    """
+    fronteiras = 0
+    for i in range(inicio, len(linha_do_tempo)):
+        atual = linha_do_tempo[i]
+        if i > 0 and atual["id_pessoa"] == linha_do_tempo[i - 1]["id_pessoa"]:
+            atual["mandato"] = linha_do_tempo[i - 1]["mandato"] + 1
+            continue
+        if i > inicio:
+            fronteiras += 1
+            if fronteiras > 1:
+                break
+        atual["mandato"] = 1
 
 
 def core_adicionar_ocupacoes_lote(
     ocupacoes: List[Ocupacao],
-    session: Session
+    session: Session,
+    abrir_solicitacoes: bool = True
 ) -> List[dict]:
-    resultados = []
-    for ocupacao in ocupacoes:
-        try:
-            nova_ocupacao = core_adicionar_ocupacao(ocupacao, session)
-            resultados.append({
-                "status": "success",
-                "message": "Ocupação adicionada com sucesso",
-                "id_ocupacao": nova_ocupacao.id_ocupacao
-            })
-        except HTTPException as he:
-            raise he
-        except Exception as e:
-            raise e
-        
-    return resultados
+    """
+    Importação em lote, orientada a conjuntos: as linhas do tempo dos cargos envolvidos
+    são carregadas numa consulta, o lote é ordenado por (id_cargo, data_inicio) e as
+    regras 0–3 e os mandatos são avaliados em memória, como se cada ocupação fosse
+    adicionada individualmente nessa ordem. A gravação é um INSERT de várias linhas,
+    um UPDATE em lote dos mandatos existentes alterados e os registros de histórico.
+
+    O lote é atômico: se algum item violar uma regra, nada é inserido e é levantado
+    um HTTPException 400 listando os itens. Violações das regras 1 e 2 abrem as
+    solicitações de aprovação de costume (apenas se não houver outros erros, para
+    que o reenvio corrigido não as duplique); com abrir_solicitacoes=False, são
+    tratadas como os demais erros.
+    Retorna um resultado por item, na ordem recebida.
+    """
+    if not ocupacoes:
+        return []
+
+    ids_cargos = {o.id_cargo for o in ocupacoes}
+    cargos = {
+        cargo.id_cargo: (cargo, nome_orgao)
+        for cargo, nome_orgao in session.exec(
+            select(Cargo, Orgao.nome)
+            .join(Orgao, Cargo.id_orgao == Orgao.id_orgao)
+            .where(Cargo.id_cargo.in_(ids_cargos))
+        ).all()
+    }
+    pessoas = dict(session.exec(
+        select(Pessoa.id_pessoa, Pessoa.nome).where(Pessoa.id_pessoa.in_({o.id_pessoa for o in ocupacoes}))
+    ).all())
+
+    # Cargos principais (regra 3) entram na carga das linhas do tempo
+    ids_principais = {cargo.substituto_para for cargo, _ in cargos.values() if cargo.substituto_para is not None}
+
+    linhas_do_tempo = {id_cargo: [] for id_cargo in ids_cargos | ids_principais}
+    existentes = session.exec(
+        select(
+            Ocupacao.id_ocupacao, Ocupacao.id_cargo, Ocupacao.id_pessoa,
+            Ocupacao.data_inicio, Ocupacao.data_fim, Ocupacao.mandato
+        )
+        .where(Ocupacao.id_cargo.in_(linhas_do_tempo))
+        .order_by(Ocupacao.id_cargo, *ORDEM_OCUPACOES)
+    ).all()
+    for id_ocupacao, id_cargo, id_pessoa, data_inicio, data_fim, mandato in existentes:
+        linhas_do_tempo[id_cargo].append({
+            "id_ocupacao": id_ocupacao,
+            "id_pessoa": id_pessoa,
+            "data_inicio": data_inicio,
+            "data_fim": data_fim,
+            "mandato": mandato,
+            "mandato_original": mandato,
+        })
+    chaves = {
+        id_cargo: [_chave_linha_do_tempo(o["data_inicio"], (0, o["id_ocupacao"])) for o in linha_do_tempo]
+        for id_cargo, linha_do_tempo in linhas_do_tempo.items()
+    }
+
+    # Principais antes dos substitutos, para que a regra 3 enxergue as ocupações do próprio lote
+    def profundidade(id_cargo: int) -> int:
+        nivel, visitados = 0, {id_cargo}
+        principal = cargos[id_cargo][0].substituto_para if id_cargo in cargos else None
+        while principal in cargos and principal not in visitados:
+            visitados.add(principal)
+            nivel += 1
+            principal = cargos[principal][0].substituto_para
+        return nivel
+
+    ordem = sorted(
+        range(len(ocupacoes)),
+        key=lambda i: (
+            profundidade(ocupacoes[i].id_cargo),
+            ocupacoes[i].id_cargo,
+            _chave_linha_do_tempo(ocupacoes[i].data_inicio, i)
+        )
+    )
+
+    erros = []        # (índice, mensagem)
+    solicitacoes = [] # (índice, mensagem, Notificacoes)
+    novas = {}        # índice -> entrada na linha do tempo
+
+    for i in ordem:
+        ocupacao = ocupacoes[i]
+        cargo, nome_orgao = cargos.get(ocupacao.id_cargo, (None, None))
+        nome_pessoa = pessoas.get(ocupacao.id_pessoa)
+
+        if cargo is None or nome_pessoa is None:
+            erros.append((i, "ID de Cargo ou Pessoa inválido."))
+            continue
+
+        # === Regra 0 ===
+        if ocupacao.data_inicio and ocupacao.data_fim and ocupacao.data_inicio > ocupacao.data_fim:
+            erros.append((i, "A data de início não pode ser posterior à data de fim."))
+            continue
+
+        linha_do_tempo = linhas_do_tempo[ocupacao.id_cargo]
+        data_inicio_nova = ocupacao.data_inicio or date.min
+        data_fim_nova = ocupacao.data_fim or date(9999, 12, 31)
+        sobrepostas = [
+            o for o in linha_do_tempo
+            if (o["data_inicio"] or date.min) <= data_fim_nova
+            and (o["data_fim"] or date(9999, 12, 31)) >= data_inicio_nova
+        ]
+
+        # === Regra 1 ===
+        # Solicitações de aprovação só fazem sentido para conflitos com o que já está no banco;
+        # conflitos entre itens do próprio lote são erros a corrigir no lote.
+        if cargo.exclusivo and sobrepostas:
+            existente = next((o for o in sobrepostas if o["id_ocupacao"] is not None), None)
+            if existente is None:
+                erros.append((i, f"O cargo {cargo.nome}, do órgão {nome_orgao}, é exclusivo e o período se sobrepõe ao do item {sobrepostas[0]['indice'] + 1}."))
+                continue
+
+            ocupante = pessoas.get(existente["id_pessoa"]) or session.get(Pessoa, existente["id_pessoa"]).nome
+            mensagem = f"O cargo {cargo.nome}, do órgão {nome_orgao}, já está ocupado por {ocupante}. Abrindo solicitação de aprovação para esta ocupação."
+            solicitacoes.append((i, mensagem, Notificacoes(
+                operation=mensagem,
+                tipo_operacao=TipoOperacao.ASSOCIACAO,
+                entidade_alvo=EntidadeAlvo.OCUPACAO,
+                dados_payload=ocupacao.model_dump(mode='json'),
+                id_afetado=existente["id_ocupacao"],
+                regra=1
+            )))
+            continue
+
+        if any(
+            o["id_pessoa"] == ocupacao.id_pessoa
+            and o["data_inicio"] == ocupacao.data_inicio
+            and o["data_fim"] == ocupacao.data_fim
+            for o in sobrepostas
+        ):
+            erros.append((i, "Já existe Ocupação com esses dados."))
+            continue
+
+        # === Regra 2 ===
+        chave = _chave_linha_do_tempo(ocupacao.data_inicio, (1, i))
+        posicao = bisect_right(chaves[ocupacao.id_cargo], chave)
+        anterior = linha_do_tempo[posicao - 1] if posicao > 0 else None
+
+        num_mandatos_seguidos = 1
+        if anterior and anterior["id_pessoa"] == ocupacao.id_pessoa:
+            num_mandatos_seguidos = (anterior["mandato"] or 0) + 1
+
+        seguinte = posicao
+        while seguinte < len(linha_do_tempo) and linha_do_tempo[seguinte]["id_pessoa"] == ocupacao.id_pessoa:
+            seguinte += 1
+
+        if num_mandatos_seguidos + (seguinte - posicao) > 2:
+            sequencia = linha_do_tempo[posicao - num_mandatos_seguidos + 1:seguinte]
+            if any(o["id_ocupacao"] is None for o in sequencia):
+                erros.append((i, f"Com os demais itens do lote, seriam mais de dois mandatos consecutivos de {nome_pessoa} no cargo {cargo.nome}."))
+                continue
+
+            mensagem = f"As últimas duas ocupações do cargo {cargo.nome} já foram de {nome_pessoa}. Criada uma solicitação de aprovação para esta ocupação."
+            solicitacoes.append((i, mensagem, Notificacoes(
+                operation=mensagem,
+                tipo_operacao=TipoOperacao.ASSOCIACAO,
+                entidade_alvo=EntidadeAlvo.OCUPACAO,
+                dados_payload=ocupacao.model_dump(mode='json'),
+                regra=2
+            )))
+            continue
+
+        # === Regra 3 ===
+        if cargo.substituto_para is not None:
+            if ocupacao.data_inicio is None:
+                erros.append((i, "Para cargos substitutos, é obrigatório informar a data de início."))
+                continue
+
+            data_ref = ocupacao.data_inicio
+            if not any(
+                (o["data_inicio"] is None or o["data_inicio"] <= data_ref)
+                and (o["data_fim"] is None or o["data_fim"] >= data_ref)
+                for o in linhas_do_tempo[cargo.substituto_para]
+            ):
+                erros.append((i, (
+                    f"Não é possível criar ocupação para o cargo substituto {cargo.id_cargo}: "
+                    f"não existe ocupação vigente para o cargo principal {cargo.substituto_para} "
+                    f"na data {data_ref}."
+                )))
+                continue
+
+        nova = {
+            "id_ocupacao": None,
+            "id_pessoa": ocupacao.id_pessoa,
+            "data_inicio": ocupacao.data_inicio,
+            "data_fim": ocupacao.data_fim,
+            "mandato": num_mandatos_seguidos,
+            "mandato_original": None,
+            "indice": i,
+        }
+        linha_do_tempo.insert(posicao, nova)
+        chaves[ocupacao.id_cargo].insert(posicao, chave)
+        _renumerar_mandatos(linha_do_tempo, posicao)
+        novas[i] = nova
+
+    if erros or solicitacoes:
+        if not erros and abrir_solicitacoes:
+            for _, _, solicitacao in solicitacoes:
+                session.add(solicitacao)
+            session.commit()
+
+        problemas = sorted(erros + [(i, mensagem) for i, mensagem, _ in solicitacoes])
+        raise HTTPException(
+            status_code=400,
+            detail="Nenhuma ocupação foi adicionada. " + " ".join(
+                f"Item {i + 1}: {mensagem}" for i, mensagem in problemas
+            )
+        )
+
+    # === Gravação ===
+    agora = datetime.utcnow()
+    indices = sorted(novas)
+    ids = session.exec(
+        insert(Ocupacao).returning(Ocupacao.id_ocupacao, sort_by_parameter_order=True),
+        params=[
+            {
+                "id_pessoa": ocupacoes[i].id_pessoa,
+                "id_cargo": ocupacoes[i].id_cargo,
+                "data_inicio": ocupacoes[i].data_inicio,
+                "data_fim": ocupacoes[i].data_fim,
+                "mandato": novas[i]["mandato"],
+                "observacoes": ocupacoes[i].observacoes,
+                "created_at": agora,
+                "updated_at": agora,
+            }
+            for i in indices
+        ]
+    ).scalars().all()
+
+    _gravar_mandatos(session, [
+        (o["id_ocupacao"], o["mandato"])
+        for linha_do_tempo in linhas_do_tempo.values()
+        for o in linha_do_tempo
+        if o["id_ocupacao"] is not None and o["mandato"] != o["mandato_original"]
+    ])
+
+    for i in indices:
+        cargo, nome_orgao = cargos[ocupacoes[i].id_cargo]
+        add_to_log(
+            session=session,
+            tipo_operacao=TipoOperacao.ASSOCIACAO,
+            entidade_alvo=EntidadeAlvo.OCUPACAO,
+            operation=f"[ADD] Adicionada ocupação de {pessoas[ocupacoes[i].id_pessoa]} no cargo de {cargo.nome}, no órgão {nome_orgao}."
+        )
+
+    return [
+        {
+            "status": "success",
+            "message": "Ocupação adicionada com sucesso",
+            "id_ocupacao": id_ocupacao
+        }
+        for id_ocupacao in ids
+    ]
 
 def _get_chain_below_ocupacoes(session: Session, ocupacao_base: Ocupacao) -> Set[int]:
     """
@@ -264,49 +541,27 @@ def _get_chain_below_ocupacoes(session: Session, ocupacao_base: Ocupacao) -> Set
     """
     ids_ocupacoes_substitutas = set()
     
-    # 1. Obter o cargo que a ocupação base está ocupando
-    cargo_pai = session.get(Cargo, ocupacao_base.id_cargo)
-
-    # 2. Iniciar a busca pelo próximo cargo na cadeia de substituição de CARGOS
-    cargo_atual_id = cargo_pai.substituto # Cargo que substitui o cargo pai
+    # 1. Cadeia de substituição de CARGOS abaixo do cargo da ocupação base (uma consulta)
+    cadeia = cadeia_abaixo(session, ocupacao_base.id_cargo)
     
     # Define as datas de referência da ocupação superior
     data_inicio_base = ocupacao_base.data_inicio or date.min
     data_fim_base = ocupacao_base.data_fim or date(9999, 12, 31)
 
-    # 3. Traversal Iterativo dos Cargos
-    while cargo_atual_id is not None:
-        
-        cargo_substituto = session.get(Cargo, cargo_atual_id)
-        if not cargo_substituto:
-            break # Fim da cadeia ou erro
-            
-        # 4. Busca Ocupações Vigentes no CARGO SUBSTITUTO
-        # A ocupação substituta deve ter seu período contido no período da ocupação base.
-        stmt = (
-            select(Ocupacao.id_ocupacao)
-            .where(Ocupacao.id_cargo == cargo_atual_id)
-            .where(
-                # A ocupação substituta DEVE ter data de início >= data de início da base
-                Ocupacao.data_inicio >= data_inicio_base
-            )
-            .where(
-                or_(
-                    # E data de fim <= data de fim da base
-                    Ocupacao.data_fim <= data_fim_base,
-                    # OU a base não tem data_fim (vigente) e o substituto não tem data_fim (vigente)
-                    and_(ocupacao_base.data_fim == None, Ocupacao.data_fim == None)
-                )
-            )
-            .order_by(Ocupacao.data_inicio.asc()) # Ordena para garantir lógica consistente
+    # 2. Ocupações de todos os cargos da cadeia
+    linhas_do_tempo = CACHE_LINHAS_DO_TEMPO.obter_varios(session, [c.id_cargo for c in cadeia])
+
+    for cargo_substituto in cadeia:
+        # 3. Busca Ocupações Vigentes no CARGO SUBSTITUTO
+        # A ocupação substituta deve ter seu período contido no período da ocupação base:
+        # data de início >= início da base e data de fim <= fim da base
+        # (ou a base e o substituto sem data_fim, ambos vigentes).
+        ids_ocupacoes_substitutas.update(
+            o.id_ocupacao
+            for o in linhas_do_tempo[cargo_substituto.id_cargo].iniciadas_a_partir_de(data_inicio_base)
+            if (o.data_fim is not None and o.data_fim <= data_fim_base)
+            or (ocupacao_base.data_fim is None and o.data_fim is None)
         )
-        
-        # Coleta todas as ocupações que se encaixam no período e no cargo
-        ids_encontrados = session.exec(stmt).all()
-        ids_ocupacoes_substitutas.update(ids_encontrados)
-        
-        # 5. Avança na Cadeia de Cargos
-        cargo_atual_id = cargo_substituto.substituto # Próximo substituto na cadeia de CARGOS
 
     return ids_ocupacoes_substitutas
 
@@ -347,21 +602,21 @@ def reajustar_mandatos_com_remocao(session: Session, ocupacao_removida: Ocupacao
         # Se o cargo não é exclusivo, não há necessidade de reajustar mandatos
         return
     
-    # Busca vizinhos (após a remoção dos substitutos, se houver)
-    previous_ocupation = _get_prev_occupacao(session, ocupacao_removida.id_cargo, ocupacao_removida.data_inicio or date.min, ocupacao_removida.id_ocupacao)
-    next_ocupation = _get_next_occupacao(session, ocupacao_removida.id_cargo, ocupacao_removida.data_inicio or date.min, ocupacao_removida.id_ocupacao)
+    # Busca vizinhos (após a remoção dos substitutos, se houver), já desconsiderando a removida
+    anteriores, posteriores = _get_sequencias_adjacentes(session, ocupacao_removida.id_cargo, ocupacao_removida.data_inicio or date.min, ocupacao_removida.id_ocupacao)
+    previous_ocupation = anteriores[-1] if anteriores else None
+    next_ocupation = posteriores[0] if posteriores else None
 
     # Identifica o PONTO DE MUDANÇA: Se a ocupação anterior e a próxima são da mesma pessoa.
     if previous_ocupation and next_ocupation and previous_ocupation.id_pessoa == next_ocupation.id_pessoa:
         
         # Sequência foi "fechada" após a remoção: Ajustar a numeração a partir de next_ocupation.
-        atual = next_ocupation
-        
         # O novo mandato do next_ocupation deve ser o mandato do previous_ocupation + 1
         contador = (previous_ocupation.mandato or 0) + 1 
-        id_pessoa_mandato_afetado = atual.id_pessoa
+        id_pessoa_mandato_afetado = next_ocupation.id_pessoa
 
-        while atual and atual.id_pessoa == previous_ocupation.id_pessoa:
+        for resumo in posteriores:
+            atual = session.get(Ocupacao, resumo.id_ocupacao)
             atual.mandato = contador
             
             # Validação de limite (contador > 2)
@@ -375,12 +630,105 @@ def reajustar_mandatos_com_remocao(session: Session, ocupacao_removida: Ocupacao
             session.add(atual) # Garante que a atualização está na sessão
             session.flush() # Persiste a mudança de mandato
             contador += 1
-            
-            # Próxima ocupação na sequência
-            atual = _get_next_occupacao(session, atual.id_cargo, atual.data_inicio or date.min, atual.id_ocupacao)
 
 
 
+# Linhas por comando UPDATE ... FROM (VALUES ...) no recálculo de mandatos
+TAMANHO_LOTE_MANDATOS = 5000
+
+
+def _gravar_mandatos(session: Session, novos_mandatos: List[tuple]):
+    """Grava pares (id_ocupacao, mandato) em lotes de UPDATE ... FROM (VALUES ...)."""
+    for i in range(0, len(novos_mandatos), TAMANHO_LOTE_MANDATOS):
+        novos = values(
+            column("id_ocupacao", Integer), column("mandato", Integer), name="novos"
+        ).data(novos_mandatos[i:i + TAMANHO_LOTE_MANDATOS])
+
+        session.exec(
+            update(Ocupacao)
+            .where(Ocupacao.id_ocupacao == novos.c.id_ocupacao)
+            .values(mandato=novos.c.mandato)
+        )
+
+
+def core_recalcular_mandatos(
+    session: Session,
+    id_cargo: Optional[int] = None,
+    id_orgao: Optional[int] = None,
+    simular: bool = False
+) -> dict:
+    """
+    Renumera Ocupacao.mandato de um cargo, de um órgão ou do banco inteiro numa
+    única passada: em cada cargo, as ocupações são ordenadas (ORDEM_OCUPACOES),
+    agrupadas em sequências consecutivas da mesma pessoa e numeradas 1, 2, ...
+    Só as linhas cujo mandato muda são gravadas, em lotes de UPDATE ... FROM (VALUES ...).
+    Com `simular`, apenas retorna as alterações.
+    """
+    janela = dict(partition_by=Ocupacao.id_cargo, order_by=ORDEM_OCUPACOES)
+
+    ordenadas = select(
+        Ocupacao.id_ocupacao,
+        Ocupacao.id_cargo,
+        Ocupacao.mandato,
+        func.row_number().over(**janela).label("posicao"),
+        case((Ocupacao.id_pessoa == func.lag(Ocupacao.id_pessoa).over(**janela), 0), else_=1).label("troca")
+    )
+    if id_cargo is not None:
+        ordenadas = ordenadas.where(Ocupacao.id_cargo == id_cargo)
+    if id_orgao is not None:
+        ordenadas = ordenadas.where(Ocupacao.id_cargo.in_(select(Cargo.id_cargo).where(Cargo.id_orgao == id_orgao)))
+    ordenadas = ordenadas.subquery()
+
+    sequencias = select(
+        ordenadas.c.id_ocupacao,
+        ordenadas.c.id_cargo,
+        ordenadas.c.mandato,
+        ordenadas.c.posicao,
+        func.sum(ordenadas.c.troca).over(partition_by=ordenadas.c.id_cargo, order_by=ordenadas.c.posicao).label("sequencia")
+    ).subquery()
+
+    recalculadas = select(
+        sequencias.c.id_ocupacao,
+        sequencias.c.mandato,
+        func.row_number().over(
+            partition_by=(sequencias.c.id_cargo, sequencias.c.sequencia),
+            order_by=sequencias.c.posicao
+        ).label("novo_mandato")
+    ).subquery()
+
+    alteracoes = session.exec(
+        select(recalculadas.c.id_ocupacao, recalculadas.c.mandato, recalculadas.c.novo_mandato)
+        .where(recalculadas.c.mandato.is_distinct_from(recalculadas.c.novo_mandato))
+        .order_by(recalculadas.c.id_ocupacao)
+    ).all()
+
+    if alteracoes and not simular:
+        _gravar_mandatos(session, [(id_ocupacao, novo) for id_ocupacao, _, novo in alteracoes])
+
+        if id_cargo is not None:
+            escopo = f"do cargo {id_cargo}"
+        elif id_orgao is not None:
+            escopo = f"dos cargos do órgão {id_orgao}"
+        else:
+            escopo = "de todos os cargos"
+
+        add_to_log(
+            session=session,
+            operation=f"Mandatos {escopo} recalculados: {len(alteracoes)} ocupações alteradas.",
+            tipo_operacao=TipoOperacao.ALTERACAO,
+            entidade_alvo=EntidadeAlvo.OCUPACAO
+        )
+
+    return {
+        "alteradas": len(alteracoes),
+        "simulacao": simular,
+        "alteracoes": [
+            {"id_ocupacao": id_ocupacao, "mandato_anterior": anterior, "mandato": novo}
+            for id_ocupacao, anterior, novo in alteracoes
+        ],
+    }
+
+
 def core_remover_ocupacao(
     id_ocupacao: int,
     session: Session
@@ -500,33 +848,164 @@ def adicionar_ocupacao(ocupacao: Ocupacao, session: Session = Depends(get_sessio
 @router.post("/lote/")
 def adicionar_ocupacoes_lote(ocupacoes: List[Ocupacao], session: Session = Depends(get_session)):
     try:
+        # Os registros de histórico já são criados pela importação
         resultados = core_adicionar_ocupacoes_lote(ocupacoes, session)
-
-        for resultado in resultados:
-            if resultado["status"] == "success":
-                # Adicionar Log
-                nova_ocupacao = session.get(Ocupacao, resultado["id_ocupacao"])
-                cargo = session.get(Cargo, nova_ocupacao.id_cargo)
-                pessoa = session.get(Pessoa, nova_ocupacao.id_pessoa)
-                orgao = session.get(Orgao, cargo.id_orgao)
-                
-                add_to_log(
-                    session=session,
-                    tipo_operacao=TipoOperacao.ASSOCIACAO,
-                    entidade_alvo=EntidadeAlvo.OCUPACAO,
-                    operation=f"[ADD] Adicionada ocupação de {pessoa.nome} no cargo de {cargo.nome}, no órgão {orgao.nome}." 
-                )
-
         session.commit()
         return {"results": resultados}
+    except IntegrityError as e:
+        session.rollback()
+        error_code = getattr(e.orig, "pgcode", None)
+        if error_code == '23505':
+            raise HTTPException(409, "Já existe Ocupação com esses dados.")
+        if error_code == '23P01':
+            raise HTTPException(409, "Uma das ocupações se sobrepõe a outra ocupação de cargo exclusivo.")
+        raise HTTPException(400, f"Erro de integridade: {e}")
+    except HTTPException:
+        session.rollback()
+        raise
     except Exception as e:
+        session.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao adicionar Ocupações em lote: {e}")
 
 
+@router.post("/renovar_mandato/orgao/{id_orgao}")
+def renovar_mandato_orgao(
+    id_orgao: int,
+    payload: RenovacaoMandatoRequest,
+    session: Session = Depends(get_session)
+):
+    """
+    Novo mandato de um órgão: cada atribuição (pessoa, cargo) vira uma ocupação iniciada em
+    payload.data_inicio. As regras 1 (cargo exclusivo ocupado) e 2 (terceiro mandato) são
+    avaliadas para o lote inteiro contra um mesmo retrato das linhas do tempo; as atribuições
+    recusadas viram solicitações de aprovação e as demais são criadas pela importação em lote
+    (um INSERT, com os mandatos numerados). Tudo numa única transação.
+    """
+    orgao = session.get(Orgao, id_orgao)
+    if not orgao:
+        raise HTTPException(404, "Órgão não encontrado.")
+
+    atribuicoes = payload.atribuicoes
+    if payload.data_fim and payload.data_fim < payload.data_inicio:
+        raise HTTPException(400, "A data de início não pode ser posterior à data de fim.")
+
+    cargos = {
+        cargo.id_cargo: cargo
+        for cargo in session.exec(
+            select(Cargo).where(Cargo.id_cargo.in_({a.id_cargo for a in atribuicoes}))
+        ).all()
+    }
+    pessoas = dict(session.exec(
+        select(Pessoa.id_pessoa, Pessoa.nome).where(Pessoa.id_pessoa.in_({a.id_pessoa for a in atribuicoes}))
+    ).all())
+
+    # Erros de preenchimento recusam o lote inteiro
+    erros = []
+    pares, cargos_atribuidos = set(), set()
+    for i, a in enumerate(atribuicoes):
+        cargo = cargos.get(a.id_cargo)
+        if cargo is None or a.id_pessoa not in pessoas:
+            erros.append(f"Item {i + 1}: ID de Cargo ou Pessoa inválido.")
+        elif cargo.id_orgao != id_orgao:
+            erros.append(f"Item {i + 1}: o cargo {cargo.nome} não pertence ao órgão {orgao.nome}.")
+        elif (a.id_pessoa, a.id_cargo) in pares or (cargo.exclusivo and a.id_cargo in cargos_atribuidos):
+            erros.append(f"Item {i + 1}: o cargo {cargo.nome} é atribuído mais de uma vez.")
+        pares.add((a.id_pessoa, a.id_cargo))
+        cargos_atribuidos.add(a.id_cargo)
+    if erros:
+        raise HTTPException(400, "Nenhuma ocupação foi adicionada. " + " ".join(erros))
+
+    # ------------------------------------------
+    # Regras 1 e 2 contra um único retrato das linhas do tempo
+    # ------------------------------------------
+    linhas_do_tempo = CACHE_LINHAS_DO_TEMPO.obter_varios(session, cargos)
+
+    # Regra 1: como na inserção, qualquer sobreposição num cargo exclusivo
+    existentes = [
+        linhas_do_tempo[a.id_cargo].primeira_sobreposta(payload.data_inicio, payload.data_fim)
+        if cargos[a.id_cargo].exclusivo else None
+        for a in atribuicoes
+    ]
+    ocupantes = {o.id_pessoa for o in existentes if o is not None} - pessoas.keys()
+    if ocupantes:
+        pessoas.update(session.exec(
+            select(Pessoa.id_pessoa, Pessoa.nome).where(Pessoa.id_pessoa.in_(ocupantes))
+        ).all())
+
+    validas, solicitacoes = [], []
+    for a, existente in zip(atribuicoes, existentes):
+        cargo = cargos[a.id_cargo]
+        linha_do_tempo = linhas_do_tempo[a.id_cargo]
+        ocupacao = Ocupacao(
+            id_pessoa=a.id_pessoa,
+            id_cargo=a.id_cargo,
+            data_inicio=payload.data_inicio,
+            data_fim=payload.data_fim
+        )
+
+        # Regra 1
+        if existente is not None:
+            mensagem = f"O cargo {cargo.nome}, do órgão {orgao.nome}, já está ocupado por {pessoas[existente.id_pessoa]}. Abrindo solicitação de aprovação para esta ocupação."
+            solicitacoes.append((a, 1, Notificacoes(
+                operation=mensagem,
+                tipo_operacao=TipoOperacao.ASSOCIACAO,
+                entidade_alvo=EntidadeAlvo.OCUPACAO,
+                dados_payload=ocupacao.model_dump(mode='json'),
+                id_afetado=existente.id_ocupacao,
+                regra=1
+            )))
+            continue
+
+        # Regra 2
+        if linha_do_tempo.mandatos_seguidos(a.id_pessoa, payload.data_inicio) > 2:
+            mensagem = f"As últimas duas ocupações do cargo {cargo.nome} já foram de {pessoas[a.id_pessoa]}. Criada uma solicitação de aprovação para esta ocupação."
+            solicitacoes.append((a, 2, Notificacoes(
+                operation=mensagem,
+                tipo_operacao=TipoOperacao.ASSOCIACAO,
+                entidade_alvo=EntidadeAlvo.OCUPACAO,
+                dados_payload=ocupacao.model_dump(mode='json'),
+                regra=2
+            )))
+            continue
+
+        validas.append(ocupacao)
+
+    try:
+        # Regras já avaliadas: o que a importação ainda recusar (ex.: regra 3) recusa o lote inteiro
+        resultados = core_adicionar_ocupacoes_lote(validas, session, abrir_solicitacoes=False)
+        session.add_all([solicitacao for _, _, solicitacao in solicitacoes])
+        session.flush()
+        ids_solicitacoes = [solicitacao.id for _, _, solicitacao in solicitacoes]
+        session.commit()
+    except IntegrityError as e:
+        session.rollback()
+        if _violou_exclusividade(e):
+            raise HTTPException(409, "Uma das ocupações se sobrepõe a outra ocupação de cargo exclusivo.")
+        raise HTTPException(400, f"Erro de integridade: {e}")
+    except HTTPException:
+        session.rollback()
+        raise
+
+    return {
+        "status": "success",
+        "ocupacoes": [
+            {"id_pessoa": o.id_pessoa, "id_cargo": o.id_cargo, "id_ocupacao": r["id_ocupacao"]}
+            for o, r in zip(validas, resultados)
+        ],
+        "solicitacoes": [
+            {"id_pessoa": a.id_pessoa, "id_cargo": a.id_cargo, "regra": regra, "id_notificacao": id_notificacao}
+            for (a, regra, _), id_notificacao in zip(solicitacoes, ids_solicitacoes)
+        ]
+    }
+
 # Listar ocupações
 @router.get("/", response_model=List[Ocupacao])
-def carregar_ocupacao(session: Session = Depends(get_session)):
+def carregar_ocupacao(request: Request, response: Response, session: Session = Depends(get_session)):
     try:
+        nao_modificado = resposta_condicional(request, response, session, Ocupacao)
+        if nao_modificado:
+            return nao_modificado
+
         return session.exec(select(Ocupacao)).all()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao carregar Ocupações: {e}")
@@ -688,6 +1167,8 @@ def alterar_ocupacao(
             raise HTTPException(409, "Nova ocupação viola restrição de unicidade.")
         if error_code == '23503':
             raise HTTPException(400, "ID de Cargo ou Pessoa inválido.")
+        if error_code == '23P01':
+            raise HTTPException(409, "A ocupação se sobrepõe a outra ocupação deste cargo exclusivo.")
         raise HTTPException(400, f"Erro de integridade: {e}")
     
     except HTTPException:
@@ -721,6 +1202,56 @@ def substituto_proximo(id_ocupacao: int, session: Session = Depends(get_session)
 
 
 
+def _consultar_cadeias_vigentes(session: Session, cadeia, data_ref: date, id_ocupacao_inicial: Optional[int] = None):
+    """
+    Numa única consulta, cada cargo das cadeias (CTE de cte_cadeia) com a ocupação vigente
+    em data_ref: entre várias, a de fim mais tardio (sem fim primeiro) e depois a de início
+    mais tardio (empates pela de menor id). No cargo inicial (nivel 0), se id_ocupacao_inicial for informado, a ocupação
+    é ela. Retorna linhas (raiz, nivel, Cargo, nome_orgao, id_ocupacao, id_pessoa, nome_pessoa)
+    ordenadas por raiz e nivel; id_ocupacao é None nos cargos sem ocupação vigente.
+    """
+    vigente = and_(
+        cadeia.c.nivel > 0 if id_ocupacao_inicial is not None else True,
+        or_(Ocupacao.data_inicio <= data_ref, Ocupacao.data_inicio == None),
+        or_(Ocupacao.data_fim == None, Ocupacao.data_fim >= data_ref)
+    )
+    if id_ocupacao_inicial is not None:
+        vigente = or_(and_(cadeia.c.nivel == 0, Ocupacao.id_ocupacao == id_ocupacao_inicial), vigente)
+
+    ocupacoes = (
+        select(
+            cadeia.c.raiz,
+            cadeia.c.nivel,
+            Ocupacao.id_ocupacao,
+            Ocupacao.id_pessoa,
+            func.row_number().over(
+                partition_by=(cadeia.c.raiz, cadeia.c.nivel),
+                order_by=(
+                    nulls_first(Ocupacao.data_fim.desc()),
+                    nulls_first(Ocupacao.data_inicio.desc()),
+                    Ocupacao.id_ocupacao
+                )
+            ).label("ordem")
+        )
+        .join(cadeia, cadeia.c.id_cargo == Ocupacao.id_cargo)
+        .where(vigente)
+        .subquery()
+    )
+
+    return session.exec(
+        select(cadeia.c.raiz, cadeia.c.nivel, Cargo, Orgao.nome, ocupacoes.c.id_ocupacao, ocupacoes.c.id_pessoa, Pessoa.nome)
+        .join(cadeia, cadeia.c.id_cargo == Cargo.id_cargo)
+        .join(Orgao, Orgao.id_orgao == Cargo.id_orgao)
+        .outerjoin(ocupacoes, and_(
+            ocupacoes.c.raiz == cadeia.c.raiz,
+            ocupacoes.c.nivel == cadeia.c.nivel,
+            ocupacoes.c.ordem == 1
+        ))
+        .outerjoin(Pessoa, Pessoa.id_pessoa == ocupacoes.c.id_pessoa)
+        .order_by(cadeia.c.raiz, cadeia.c.nivel)
+    ).all()
+
+
 @router.put("/finalizar/{id_ocupacao}")
 def finalizar_ocupacao(
     id_ocupacao: int,
@@ -729,144 +1260,260 @@ def finalizar_ocupacao(
 ):
 
     # ------------------------------------------
-    # 1. Buscar ocupação e cargo atual
+    # 1. Cadeia completa (para baixo) a partir do cargo da ocupação, com a ocupação
+    #    vigente em data_fim de cada cargo, numa única consulta
     # ------------------------------------------
-    ocupacao = session.get(Ocupacao, id_ocupacao)
-    if not ocupacao:
+    cadeia = cte_cadeia(
+        Cargo.substituto,
+        Cargo.id_cargo == select(Ocupacao.id_cargo).where(Ocupacao.id_ocupacao == id_ocupacao).scalar_subquery()
+    )
+    linhas = _consultar_cadeias_vigentes(session, cadeia, payload.data_fim, id_ocupacao_inicial=id_ocupacao)
+
+    if not linhas or linhas[0][4] is None:
         raise HTTPException(404, "Ocupação não encontrada.")
-    
-    pessoa = session.get(Pessoa, ocupacao.id_pessoa)
-    cargo = session.get(Cargo, ocupacao.id_cargo)
-    orgao = session.get(Orgao, cargo.id_orgao)
 
-    ocupacao.data_fim = payload.data_fim
-    cargo_atual = session.get(Cargo, ocupacao.id_cargo)
+    # Cadeia = [A, B, C, D]   (A é o titular); num ciclo, para no primeiro cargo repetido
+    cadeia, vistos = [], set()
+    for _, _, cargo, nome_orgao, id_vigente, id_pessoa, nome_pessoa in linhas:
+        if cargo.id_cargo in vistos:
+            break
+        vistos.add(cargo.id_cargo)
+        cadeia.append((cargo, nome_orgao, id_vigente, id_pessoa, nome_pessoa))
 
-    if not cargo_atual:
-        raise HTTPException(500, "Cargo associado à ocupação não existe (!).")
+    cargo_atual, nome_orgao, _, _, nome_pessoa = cadeia[0]
 
     if(cargo_atual.ativo == False):
         raise HTTPException(400, "O cargo associado à ocupação está inativo.")
     
     if(cargo_atual.substituto is None and not payload.definitiva):
         raise HTTPException(400, "Não é possível fazer substituição automática: o cargo não possui substituto.")
-    
-    # ------------------------------------------
-    # 2. Obter cadeia completa (para baixo)
-    # ------------------------------------------
-    cadeia = []
-    atual = cargo_atual
-
-    while atual is not None:
-        cadeia.append(atual)
-        atual = session.get(Cargo, atual.substituto) if atual.substituto else None
-
-    # Cadeia = [A, B, C, D]   (A é o titular)
 
     # ------------------------------------------
-    # 3. Finalizar todas as ocupações vigentes da cadeia
+    # 2. Finalizar todas as ocupações vigentes da cadeia (um UPDATE)
     # ------------------------------------------
-    ocupacoes = [ocupacao]
-
-    for cargo in cadeia[1:]:
-        query = (
-            select(Ocupacao)
-            .where(Ocupacao.id_cargo == cargo.id_cargo)
-            .where(
-                # data_inicio <= data_ref  OU  inicio NULL
-                or_(
-                    Ocupacao.data_inicio <= payload.data_fim,
-                    Ocupacao.data_inicio == None
-                )
-            )
-            .where(
-                # data_fim >= data_ref  OU  fim NULL
-                or_(
-                    Ocupacao.data_fim == None,
-                    Ocupacao.data_fim >= payload.data_fim
-                )
-            )
+    # (id_ocupacao, id_cargo, id_pessoa) da ocupação finalizada e das vigentes nos substitutos
+    ocupacoes = [
+        (id_vigente, cargo.id_cargo, id_pessoa)
+        for cargo, _, id_vigente, id_pessoa, _ in cadeia
+        if id_vigente is not None
+    ]
 
-            # ORDER BY NULLS FIRST
-            .order_by(
-                nulls_first(Ocupacao.data_fim.desc()),
-                nulls_first(Ocupacao.data_inicio.desc())
-            )
-            
+    try:
+        session.exec(
+            update(Ocupacao)
+            .where(Ocupacao.id_ocupacao.in_([o[0] for o in ocupacoes]))
+            .values(data_fim=payload.data_fim)
         )
 
+        # ------------------------------------------
+        # CASO 1 — FINALIZAÇÃO DEFINITIVA
+        # ------------------------------------------
+        if payload.definitiva:
+            add_to_log(
+                session=session,
+                tipo_operacao=TipoOperacao.FINALIZACAO,
+                entidade_alvo=EntidadeAlvo.OCUPACAO,
+                operation=f"[END] Finalizada ocupação de {nome_pessoa} no cargo de {cargo_atual.nome}, no órgão {nome_orgao}."
+            )
+            session.commit()
+            return {
+                "status": "success",
+                "message": "Ocupação finalizada definitivamente e cadeia encerrada.",
+                "ids": [cargo.id_cargo for cargo, *_ in cadeia]
+            }
 
-        oc = session.exec(query).first()
+        # ------------------------------------------
+        # CASO 2 — SUBSTITUIÇÃO AUTOMÁTICA
+        # ------------------------------------------
 
-        if oc:
-            oc.data_fim = payload.data_fim
-            ocupacoes.append(oc)
+        if len(ocupacoes) < 2:
+            raise HTTPException(400, "Não há substitutos na cadeia para assumir a ocupação.")
 
-    session.flush()
+        # cadeia = [A, B, C, D]
+        # criar novas ocupações (um INSERT):
+        #   B assume A
+        #   C assume B
+        #   D assume C
+        novos_ids = _inserir_substituicoes(session, [ocupacoes], payload)
 
-    # ------------------------------------------
-    # CASO 1 — FINALIZAÇÃO DEFINITIVA
-    # ------------------------------------------
-    if payload.definitiva:
         add_to_log(
             session=session,
             tipo_operacao=TipoOperacao.FINALIZACAO,
             entidade_alvo=EntidadeAlvo.OCUPACAO,
-            operation=f"[END] Finalizada ocupação de {pessoa.nome} no cargo de {cargo.nome}, no órgão {orgao.nome}."
+            operation=f"[END] Finalizada ocupação de {nome_pessoa} no cargo de {cargo_atual.nome}, no órgão {nome_orgao}. Substitutos assumiram."
         )
+
         session.commit()
+
         return {
             "status": "success",
-            "message": "Ocupação finalizada definitivamente e cadeia encerrada.",
-            "ids": [c.id_cargo for c in cadeia]
+            "message": "Ocupação finalizada e substitutos assumiram automaticamente.",
+            "ids": novos_ids
         }
 
+    except IntegrityError as e:
+        _erro_integridade_finalizacao(session, e)
+    except HTTPException:
+        session.rollback()
+        raise
+
+
+def _erro_integridade_finalizacao(session: Session, e: IntegrityError):
+    """Desfaz a finalização e traduz a violação de restrição, como nos demais endpoints."""
+    session.rollback()
+    error_code = getattr(e.orig, "pgcode", None)
+    if error_code == '23505':
+        raise HTTPException(409, "Uma das substituições já existe (mesma pessoa, cargo, data de início e mandato).")
+    if error_code == '23503':
+        raise HTTPException(400, "ID de Cargo ou Pessoa inválido.")
+    if error_code == '23P01':
+        raise HTTPException(409, "Uma das substituições se sobrepõe a outra ocupação de cargo exclusivo.")
+    raise HTTPException(400, f"Erro de integridade: {e}")
+
+
+def _inserir_substituicoes(session: Session, cadeias: List[List[tuple]], payload: FinalizarOcupacaoRequest) -> List[int]:
+    """
+    Em cada cadeia de ocupações finalizadas [(id_ocupacao, id_cargo, id_pessoa), ...],
+    a pessoa de cada uma assume o cargo da anterior. Um único INSERT para todas as cadeias.
+    Sem data_inicio_substitutos, os substitutos começam no dia seguinte a data_fim: os
+    períodos são inclusivos nas duas pontas, e começar em data_fim sobreporia a ocupação
+    finalizada (violando a regra 1 / ocupacao_exclusiva_sem_sobreposicao).
+    """
+    data_inicio = payload.data_inicio_substitutos or payload.data_fim + timedelta(days=1)
+    agora = datetime.utcnow()
+
+    novas = [
+        {
+            "id_pessoa": atual[2],
+            "id_cargo": acima[1],
+            "data_inicio": data_inicio,
+            "data_fim": payload.data_fim_substitutos,
+            "mandato": 1,
+            "observacoes": "Substituição automática",
+            "created_at": agora,
+            "updated_at": agora,
+        }
+        for ocupacoes in cadeias
+        for acima, atual in zip(ocupacoes, ocupacoes[1:])
+    ]
+    if not novas:
+        return []
+
+    return session.exec(
+        insert(Ocupacao).returning(Ocupacao.id_ocupacao, sort_by_parameter_order=True),
+        params=novas
+    ).scalars().all()
+
+
+@router.put("/finalizar/orgao/{id_orgao}")
+def finalizar_ocupacoes_orgao(
+    id_orgao: int,
+    payload: FinalizarOcupacaoRequest,
+    session: Session = Depends(get_session)
+):
+    """
+    Fim de mandato de um órgão inteiro: finaliza em payload.data_fim todas as ocupações
+    vigentes nos cargos do órgão e nas cadeias de substituição que partem deles. Se não for
+    definitiva, em cada cadeia cujo titular (ativo) tem ocupação vigente e que tem
+    substitutos vigentes, os substitutos assumem, como em finalizar_ocupacao. Tudo numa única transação.
+    """
+    orgao = session.get(Orgao, id_orgao)
+    if not orgao:
+        raise HTTPException(404, "Órgão não encontrado.")
+
     # ------------------------------------------
-    # CASO 2 — SUBSTITUIÇÃO AUTOMÁTICA
+    # 1. Cadeias a partir dos titulares do órgão (cargos sem substituto_para dentro
+    #    do órgão), com a ocupação vigente de cada cargo, numa única consulta
     # ------------------------------------------
+    cargos_orgao = select(Cargo.id_cargo).where(Cargo.id_orgao == id_orgao).correlate(None)
+    cadeia = cte_cadeia(
+        Cargo.substituto,
+        Cargo.id_orgao == id_orgao,
+        or_(Cargo.substituto_para == None, Cargo.substituto_para.not_in(cargos_orgao))
+    )
+    linhas = _consultar_cadeias_vigentes(session, cadeia, payload.data_fim)
+
+    # raiz -> [(id_ocupacao, id_cargo, id_pessoa), ...] das ocupações vigentes, em ordem;
+    # num ciclo (ou cadeias que se encontram), cada cargo entra só na primeira vez
+    cadeias, titulares, vistos = {}, set(), set()
+    raiz_atual, interrompida = None, False
+    for raiz, nivel, cargo, _, id_vigente, id_pessoa, _ in linhas:
+        if raiz != raiz_atual:
+            raiz_atual, interrompida = raiz, False
+            cadeias[raiz] = []
+            # Só há substituição quando o titular (ativo) tem uma ocupação sendo finalizada
+            if cargo.ativo and id_vigente is not None:
+                titulares.add(raiz)
+        if interrompida or cargo.id_cargo in vistos:
+            interrompida = True
+            continue
+        vistos.add(cargo.id_cargo)
+        if id_vigente is not None:
+            cadeias[raiz].append((id_vigente, cargo.id_cargo, id_pessoa))
 
-    if len(ocupacoes) < 2:
-        raise HTTPException(400, "Não há substitutos na cadeia para assumir a ocupação.")
+    # ------------------------------------------
+    # 2. Finalizar todas as ocupações vigentes dos cargos do órgão e das cadeias (um UPDATE)
+    # ------------------------------------------
+    finalizadas = session.exec(
+        update(Ocupacao)
+        .where(or_(Ocupacao.id_cargo.in_(cargos_orgao), Ocupacao.id_cargo.in_(vistos)))
+        .where(or_(Ocupacao.data_inicio <= payload.data_fim, Ocupacao.data_inicio == None))
+        .where(or_(Ocupacao.data_fim == None, Ocupacao.data_fim >= payload.data_fim))
+        .values(data_fim=payload.data_fim)
+        .returning(Ocupacao.id_ocupacao)
+    ).scalars().all()
 
-    
-    data_inicio = payload.data_inicio_substitutos or payload.data_fim
-    data_fim_nova = payload.data_fim_substitutos
-
-    # cadeia = [A, B, C, D]
-    # criar novas ocupações:
-    #   B assume A
-    #   C assume B
-    #   D assume C
-    novos_ids = []
-
-    for i in range(1, len(ocupacoes)):
-
-        acima = ocupacoes[i - 1]
-        atual = ocupacoes[i]
-
-        nova = Ocupacao(
-            id_pessoa = atual.id_pessoa,
-            id_cargo = acima.id_cargo,
-            data_inicio = data_inicio,
-            data_fim = data_fim_nova,
-            mandato = 1,
-            observacoes = "Substituição automática"
-        )
+    # ------------------------------------------
+    # 3. Substituição automática nas cadeias que têm substitutos (um INSERT)
+    # ------------------------------------------
+    substituicoes = []
+    if not payload.definitiva:
+        substituicoes = [
+            ocupacoes for raiz, ocupacoes in cadeias.items()
+            if raiz in titulares and len(ocupacoes) >= 2
+        ]
 
-        session.add(nova)
-        novos_ids.append(nova.id_ocupacao)
-    
-    add_to_log(
-        session=session,
-        tipo_operacao=TipoOperacao.FINALIZACAO,
-        entidade_alvo=EntidadeAlvo.OCUPACAO,
-        operation=f"[END] Finalizada ocupação de {pessoa.nome} no cargo de {cargo.nome}, no órgão {orgao.nome}. Substitutos assumiram."
-    )
+    try:
+        novos_ids = _inserir_substituicoes(session, substituicoes, payload)
 
-    session.commit()
+        operacao = f"[END] Finalizadas {len(finalizadas)} ocupações no órgão {orgao.nome}."
+        if substituicoes:
+            operacao += f" Substitutos assumiram em {len(substituicoes)} cadeias."
+        add_to_log(
+            session=session,
+            tipo_operacao=TipoOperacao.FINALIZACAO,
+            entidade_alvo=EntidadeAlvo.OCUPACAO,
+            operation=operacao
+        )
+
+        session.commit()
+    except IntegrityError as e:
+        _erro_integridade_finalizacao(session, e)
 
     return {
         "status": "success",
-        "message": "Ocupação finalizada e substitutos assumiram automaticamente.",
+        "message": "Ocupações do órgão finalizadas." if not substituicoes
+            else "Ocupações do órgão finalizadas e substitutos assumiram automaticamente.",
+        "finalizadas": sorted(finalizadas),
         "ids": novos_ids
-    }
\ No newline at end of file
+    }
+
+
+# Recalcular mandatos (administração)
+@router.post("/recalcular_mandatos/", dependencies=[Depends(role_required(UserRole.ADMIN))])
+def recalcular_mandatos(
+    id_cargo: Optional[int] = Query(None, description="Recalcula apenas este cargo"),
+    id_orgao: Optional[int] = Query(None, description="Recalcula apenas os cargos deste órgão"),
+    simular: bool = Query(False, description="Se 'true', apenas lista as alterações, sem gravar"),
+    session: Session = Depends(get_session)
+):
+    if id_cargo is not None and id_orgao is not None:
+        raise HTTPException(status_code=400, detail="Informe apenas id_cargo ou id_orgao.")
+
+    try:
+        resultado = core_recalcular_mandatos(session, id_cargo=id_cargo, id_orgao=id_orgao, simular=simular)
+        session.commit()
+        return resultado
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Erro ao recalcular mandatos: {e}")
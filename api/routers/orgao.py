@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
 from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 from utils.history_log import add_to_log
 from models.orgao import Orgao
 from utils.enums import TipoOperacao, EntidadeAlvo
+from utils.etag import resposta_condicional
 from database import get_session
 
 router = APIRouter(prefix="/api/orgao", tags=["Órgão"])
@@ -102,8 +103,12 @@ def adicionar_orgaos_lote(orgaos: list[Orgao], session: Session = Depends(get_se
     
 # Listar órgãos
 @router.get("/")
-def carregar_orgao(session: Session = Depends(get_session)):
+def carregar_orgao(request: Request, response: Response, session: Session = Depends(get_session)):
     try:
+        nao_modificado = resposta_condicional(request, response, session, Orgao)
+        if nao_modificado:
+            return nao_modificado
+
         orgaos = session.exec(select(Orgao)).all()
         return orgaos
     except Exception as e:
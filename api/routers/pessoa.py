@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
 from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 from models.pessoa import Pessoa
 from database import get_session
 from utils.history_log import add_to_log
 from utils.enums import TipoOperacao, EntidadeAlvo
+from utils.etag import resposta_condicional
 
 router = APIRouter(prefix="/api/pessoa", tags=["Pessoa"])
 
@@ -106,8 +107,12 @@ def reativar_pessoa(
     }
 
 @router.get("/")
-def carregar_pessoa(session: Session = Depends(get_session)):
+def carregar_pessoa(request: Request, response: Response, session: Session = Depends(get_session)):
     try:
+        nao_modificado = resposta_condicional(request, response, session, Pessoa)
+        if nao_modificado:
+            return nao_modificado
+
         pessoas = session.exec(select(Pessoa)).all()
         return pessoas
     except Exception as e:
@@ -1,19 +1,35 @@
+import asyncio
 import csv
-from typing import Any, List, Literal
-from fastapi import APIRouter, Depends
-from fastapi.responses import StreamingResponse
+import os
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from datetime import date
+from typing import Any, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
-from io import BytesIO, StringIO
+from io import StringIO
 from pydantic import BaseModel
 from sqlmodel import Session
 
 from reportlab.platypus import Paragraph
 
-from routers.busca import core_busca_generica
-from database import get_session
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # dependência opcional: só necessária para /export/arrow e /export/parquet
+    pa = pq = None
+
+from routers.busca import core_busca_generica, iterar_linhas_stream, montar_query_ordenada, versao_busca
+from database import engine, get_session
+from utils.export_jobs import GerenciadorExportacoes, JobExportacao
 
 
 router = APIRouter(
@@ -32,9 +48,88 @@ def secure_get_dados(field: str, dados: List[Any], standard_value: Any = None):
     value = value if value is not None else standard_value
     return value
  
-def gerar_pdf_agrupado(dados, elementos, styles, group_by: str = "cargo"):
+# Máximo de linhas por tabela do PDF. O custo de layout do reportlab cresce muito
+# com tabelas grandes (principalmente com SPAN), então cada grupo vira uma tabela
+# própria e grupos/listas maiores que isso são divididos em blocos.
+TAMANHO_BLOCO_PDF = 200
+
+# Nos modos agrupados o rótulo é mesclado (SPAN) em todo o bloco, e uma célula
+# mesclada não pode ser quebrada entre páginas: o bloco precisa caber numa página.
+TAMANHO_BLOCO_GRUPO_PDF = 20
+
+LARGURAS_COLUNAS_PDF = [80, 80, 100, 60, 60, 50, 150]
+
+CABECALHOS_PDF = {
+    "cargo": ["Cargo", "Órgão", "Pessoa", "Início", "Fim", "Mandato", "Observações"],
+    "pessoa": ["Pessoa", "Cargo", "Órgão", "Início", "Fim", "Mandato", "Observações"],
+    "orgao": ["Órgão", "Cargo", "Pessoa", "Início", "Fim", "Mandato", "Observações"],
+    "flat": ["Pessoa", "Cargo", "Órgão", "Início", "Fim", "Mandato", "Observações"],
+}
+
+
+def _nova_tabela(header, linhas, style_cmds=()):
+    style = [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+        ("ALIGN", (0, 0), (-1, 0), "CENTER"),
+        *style_cmds
+    ]
+    tabela = Table([header] + linhas, repeatRows=1, colWidths=LARGURAS_COLUNAS_PDF)
+    tabela.setStyle(TableStyle(style))
+    return tabela
+
+
+def _blocos(lista, tamanho):
+    for i in range(0, len(lista), tamanho):
+        yield lista[i:i + tamanho]
+
+
+def _linhas_grupo(bloco, group_by, styles, BLANK_SYMBOL):
     """
-    Gera um PDF (adiciona uma tabela a `elementos`) com os dados agrupados conforme `group_by`.
+    Converte um grupo em (rótulos, linhas), onde rótulos são as colunas mescladas
+    à esquerda e linhas são as demais colunas de cada ocupação.
+    Grupos sem ocupações retornam linhas vazias.
+    """
+    if group_by == "cargo":
+        rotulos = [bloco.get("cargo", ""), bloco.get("orgao", "")]
+        linhas = []
+        for o in bloco.get("ocupacoes", []):
+            mandato = str(o.get("mandato", BLANK_SYMBOL)) if o.get("mandato") is not None else BLANK_SYMBOL
+            mandato = mandato if o.get("exclusivo", False) and mandato else BLANK_SYMBOL
+            linhas.append([
+                secure_get_dados("pessoa", o, BLANK_SYMBOL),
+                o.get("data_inicio", BLANK_SYMBOL) or BLANK_SYMBOL,
+                o.get("data_fim", BLANK_SYMBOL) or BLANK_SYMBOL,
+                mandato,
+                secure_get_dados("observacoes", o, BLANK_SYMBOL)
+            ])
+        return rotulos, linhas
+
+    # pessoa / orgao
+    rotulos = [bloco.get(group_by, BLANK_SYMBOL)]
+    linhas = []
+    for o in bloco.get("cargos", []):
+        mandato = BLANK_SYMBOL if o.get("mandato") is None else str(o.get("mandato"))
+        if not o.get("exclusivo", False):
+            mandato = BLANK_SYMBOL
+
+        segunda_coluna = "orgao" if group_by == "pessoa" else "pessoa"
+        linhas.append([
+            secure_get_dados("cargo", o, BLANK_SYMBOL),
+            secure_get_dados(segunda_coluna, o, BLANK_SYMBOL),
+            o.get("data_inicio", BLANK_SYMBOL) or BLANK_SYMBOL,
+            o.get("data_fim", BLANK_SYMBOL) or BLANK_SYMBOL,
+            mandato,
+            Paragraph(secure_get_dados("observacoes", o, BLANK_SYMBOL), styles)
+        ])
+    return rotulos, linhas
+
+
+def gerar_tabelas_pdf(dados, styles, group_by: str = "cargo"):
+    """
+    Gera as tabelas do PDF com os dados agrupados conforme `group_by`:
+    uma tabela por grupo (dividida em blocos de TAMANHO_BLOCO_GRUPO_PDF linhas)
+    ou, no modo flat, uma tabela por bloco de TAMANHO_BLOCO_PDF linhas.
     group_by: "cargo" | "pessoa" | "orgao" | "flat"
     - espera `dados` no formato:
       * cargo: [{"cargo": "...", "orgao": "...", "ocupacoes": [{...}, ...]}, ...]
@@ -45,169 +140,110 @@ def gerar_pdf_agrupado(dados, elementos, styles, group_by: str = "cargo"):
 
     BLANK_SYMBOL = "-"
 
-    # configuração de colunas por modo (rótulos e ordem)
-    if group_by == "cargo":
-        header = ["Cargo", "Órgão", "Pessoa", "Início", "Fim", "Mandato", "Observações"]
-    elif group_by == "pessoa":
-        header = ["Pessoa", "Cargo", "Órgão", "Início", "Fim", "Mandato", "Observações"]
-    elif group_by == "orgao":
-        header = ["Órgão", "Cargo", "Pessoa", "Início", "Fim", "Mandato", "Observações"]
-    elif group_by == "flat":
-        header = ["Pessoa", "Cargo", "Órgão", "Início", "Fim", "Mandato", "Observações"]
-    else:
+    if group_by not in CABECALHOS_PDF:
         raise ValueError("group_by inválido — use 'cargo','pessoa','orgao' ou 'flat'.")
 
-    table_data = [header]
-    style_cmds = [
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
-        ("ALIGN", (0, 0), (-1, 0), "CENTER"),
-    ]
-    
-    next_row_idx = 1  # primeira linha após header
-    spans_to_add = []  # acumula spans (start_row, end_row, col_start, col_end)
+    header = CABECALHOS_PDF[group_by]
 
-    # monta linhas dependendo do modo
     if group_by == "flat":
         # dados já são linhas planas
-        for item in dados:
-
-            pessoa = Paragraph(item.get("pessoa") or BLANK_SYMBOL, styles)
-            cargo = Paragraph(item.get("cargo") or BLANK_SYMBOL, styles)
-            orgao = Paragraph(item.get("orgao") or BLANK_SYMBOL, styles)
-            inicio = item.get("data_inicio") or BLANK_SYMBOL
-            fim = item.get("data_fim") or BLANK_SYMBOL
-            exclusivo = item.get("exclusivo", False)
-            mandato = str(item.get("mandato")) if exclusivo and item.get("mandato") is not None else BLANK_SYMBOL
-            observacoes = Paragraph(item.get("observacoes") or BLANK_SYMBOL, styles)
-            
-            table_data.append([pessoa, cargo, orgao, inicio, fim, mandato, observacoes])
-            next_row_idx += 1
-
-    else:
-        # modos agrupados: percorre blocos
-        for bloco in dados:
-    
-            # extrai a lista de ocupações dependendo do formato
+        for bloco in _blocos(dados, TAMANHO_BLOCO_PDF):
+            linhas = []
+            for item in bloco:
+                pessoa = Paragraph(item.get("pessoa") or BLANK_SYMBOL, styles)
+                cargo = Paragraph(item.get("cargo") or BLANK_SYMBOL, styles)
+                orgao = Paragraph(item.get("orgao") or BLANK_SYMBOL, styles)
+                inicio = item.get("data_inicio") or BLANK_SYMBOL
+                fim = item.get("data_fim") or BLANK_SYMBOL
+                exclusivo = item.get("exclusivo", False)
+                mandato = str(item.get("mandato")) if exclusivo and item.get("mandato") is not None else BLANK_SYMBOL
+                observacoes = Paragraph(item.get("observacoes") or BLANK_SYMBOL, styles)
+
+                linhas.append([pessoa, cargo, orgao, inicio, fim, mandato, observacoes])
+            yield _nova_tabela(header, linhas)
+        return
+
+    # modos agrupados: uma tabela por grupo
+    for grupo in dados:
+        rotulos, linhas = _linhas_grupo(grupo, group_by, styles, BLANK_SYMBOL)
+        n = len(rotulos)
+
+        if not linhas:
             if group_by == "cargo":
-                ocupacoes = bloco.get("ocupacoes", [])
-                label1 = bloco.get("cargo", "")
-                label2 = bloco.get("orgao", "")
-                # cada ocupação: pessoa, inicio, fim, mandato, id_ocupacao
-
-                
-                rows = [
-                    [secure_get_dados("pessoa", o, BLANK_SYMBOL),
-                     o.get("data_inicio", BLANK_SYMBOL) or BLANK_SYMBOL, 
-                     o.get("data_fim", BLANK_SYMBOL) or BLANK_SYMBOL, 
-                     str(o.get("mandato", BLANK_SYMBOL)) if o.get("mandato") is not None else BLANK_SYMBOL, 
-                     secure_get_dados("observacoes", o, BLANK_SYMBOL), 
-                     o.get("exclusivo", False)]
-                    for o in ocupacoes
+                vazia = rotulos + ["Sem ocupações.", BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL]
+                style_cmds = [
+                    ("SPAN", (2, 1), (5, 1)),
+                    ("VALIGN", (0, 1), (1, 1), "MIDDLE"),
+                    ("ALIGN", (2, 1), (5, 1), "LEFT"),
                 ]
-                # para este layout precisamos inserir Cargo, Orgão nas duas primeiras colunas
-                if not ocupacoes:
-                    table_data.append([label1, label2, "Sem ocupações.", BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL])
-                    style_cmds.append(("SPAN", (2, next_row_idx), (5, next_row_idx)))
-                    style_cmds.append(("VALIGN", (0, next_row_idx), (1, next_row_idx), "MIDDLE"))
-                    style_cmds.append(("ALIGN", (2, next_row_idx), (5, next_row_idx), "LEFT"))
-                    next_row_idx += 1
-                    continue
-
-                start = next_row_idx
-                for i, r in enumerate(rows):
-                    pessoa, inicio, fim, mandato, observacoes, exclusivo = r
-                    mandato = mandato if exclusivo and mandato else BLANK_SYMBOL
-                    if i == 0:
-                        table_data.append([label1, label2, pessoa, inicio, fim, mandato, observacoes])
-                    else:
-                        table_data.append([BLANK_SYMBOL, BLANK_SYMBOL, pessoa, inicio, fim, mandato, observacoes])
-                    next_row_idx += 1
-                end = next_row_idx - 1
-                if start <= end and (end - start + 1) >= 1:
-                    # mesclar col 0 e 1 entre start..end
-                    spans_to_add.append((start, end, 0, 0))  # cargo col
-                    spans_to_add.append((start, end, 1, 1))  # orgao col
-
-            elif group_by == "pessoa":
-                ocupacoes = bloco.get("cargos", [])
-                label = bloco.get("pessoa", BLANK_SYMBOL)
-                if not ocupacoes:
-                    table_data.append([label, BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL])
-                    style_cmds.append(("SPAN", (1, next_row_idx), (6, next_row_idx)))
-                    style_cmds.append(("VALIGN", (0, next_row_idx), (0, next_row_idx), "MIDDLE"))
-                    style_cmds.append(("ALIGN", (1, next_row_idx), (6, next_row_idx), "LEFT"))
-                    next_row_idx += 1
-                    continue
-
-                start = next_row_idx
-                for i, o in enumerate(ocupacoes):
-                    
-                    cargo = secure_get_dados("cargo", o, BLANK_SYMBOL)
-                    orgao = secure_get_dados("orgao", o, BLANK_SYMBOL)
-                    
-                    inicio = o.get("data_inicio", BLANK_SYMBOL) or BLANK_SYMBOL
-                    fim = o.get("data_fim", BLANK_SYMBOL) or BLANK_SYMBOL
-                    mandato = BLANK_SYMBOL if o.get("mandato") is None else str(o.get("mandato"))
-                    exclusivo = o.get("exclusivo", False)
-                    if not exclusivo:
-                        mandato = BLANK_SYMBOL
-
-                    observacoes = Paragraph(secure_get_dados("observacoes", o, BLANK_SYMBOL), styles)
-
-                    if i == 0:
-                        table_data.append([label, cargo, orgao, inicio, fim, mandato, observacoes])
-                    else:
-                        table_data.append([BLANK_SYMBOL, cargo, orgao, inicio, fim, mandato, observacoes])
-                    next_row_idx += 1
-                end = next_row_idx - 1
-                spans_to_add.append((start, end, 0, 0))  # mesclar coluna Pessoa
-
-            elif group_by == "orgao":
-                ocupacoes = bloco.get("cargos", [])
-                label = bloco.get("orgao", BLANK_SYMBOL)
-                if not ocupacoes:
-                    table_data.append([label, BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL, BLANK_SYMBOL])
-                    style_cmds.append(("SPAN", (1, next_row_idx), (6, next_row_idx)))
-                    style_cmds.append(("VALIGN", (0, next_row_idx), (0, next_row_idx), "MIDDLE"))
-                    style_cmds.append(("ALIGN", (1, next_row_idx), (6, next_row_idx), "LEFT"))
-                    next_row_idx += 1
-                    continue
-
-                start = next_row_idx
-                for i, o in enumerate(ocupacoes):
-                    cargo = secure_get_dados("cargo", o, BLANK_SYMBOL)
-                    pessoa = secure_get_dados("pessoa", o, BLANK_SYMBOL)
-                    inicio = o.get("data_inicio", BLANK_SYMBOL) or BLANK_SYMBOL
-                    fim = o.get("data_fim", BLANK_SYMBOL) or BLANK_SYMBOL
-                    mandato = BLANK_SYMBOL if o.get("mandato") is None else str(o.get("mandato"))
-                    exclusivo = o.get("exclusivo", False)
-                    if not exclusivo:
-                        mandato = BLANK_SYMBOL
-
-                    observacoes = Paragraph(secure_get_dados("observacoes", o, BLANK_SYMBOL), styles)
-
-                    if i == 0:
-                        table_data.append([label, cargo, pessoa, inicio, fim, mandato, observacoes])
-                    else:
-                        table_data.append([BLANK_SYMBOL, cargo, pessoa, inicio, fim, mandato, observacoes])
-                    next_row_idx += 1
-                end = next_row_idx - 1
-                spans_to_add.append((start, end, 0, 0))  # mesclar coluna Órgão
-
-    # aplica spans acumulados no estilo
-    for start, end, c0, c1 in spans_to_add:
-        style_cmds.append(("SPAN", (c0, start), (c1, end)))
-        # centraliza verticalmente a célula mesclada
-        style_cmds.append(("VALIGN", (c0, start), (c1, end), "MIDDLE"))
-        style_cmds.append(("ALIGN", (c0, start), (c1, end), "CENTER"))
-
-    tabela = Table(table_data, repeatRows=1, colWidths=[80, 80, 100, 60, 60, 50, 150])
-    tabela.setStyle(TableStyle(style_cmds))
-
-    elementos.append(tabela)
-    elementos.append(Spacer(1, 18))
+            else:
+                vazia = rotulos + [BLANK_SYMBOL] * 6
+                style_cmds = [
+                    ("SPAN", (1, 1), (6, 1)),
+                    ("VALIGN", (0, 1), (0, 1), "MIDDLE"),
+                    ("ALIGN", (1, 1), (6, 1), "LEFT"),
+                ]
+            yield _nova_tabela(header, [vazia], style_cmds)
+            continue
+
+        for bloco in _blocos(linhas, TAMANHO_BLOCO_GRUPO_PDF):
+            # o rótulo aparece na primeira linha do bloco e é mesclado com as demais
+            tabela = [rotulos + bloco[0]] + [[BLANK_SYMBOL] * n + linha for linha in bloco[1:]]
+            style_cmds = []
+            for c in range(n):
+                style_cmds.append(("SPAN", (c, 1), (c, len(bloco))))
+                # centraliza verticalmente a célula mesclada
+                style_cmds.append(("VALIGN", (c, 1), (c, len(bloco)), "MIDDLE"))
+                style_cmds.append(("ALIGN", (c, 1), (c, len(bloco)), "CENTER"))
+            yield _nova_tabela(header, tabela, style_cmds)
+
+
+def gerar_pdf_agrupado(dados, elementos, styles, group_by: str = "cargo"):
+    """Adiciona a `elementos` as tabelas de gerar_tabelas_pdf, separadas por espaçamento."""
+    for tabela in gerar_tabelas_pdf(dados, styles, group_by):
+        elementos.append(tabela)
+        elementos.append(Spacer(1, 12))
+
+
+def renderizar_pdf(dados, tipo: str, caminho: str):
+    """
+    Renderiza o relatório em `caminho`. Roda em um processo do POOL_PDF,
+    por isso recebe apenas dados serializáveis e cria os estilos localmente.
+    """
+    doc = SimpleDocTemplate(caminho, pagesize=A4)
+    styles = getSampleStyleSheet()
+    elementos = [Spacer(1, 3)]
+
+    group_by = tipo if tipo in ("cargo", "pessoa", "orgao") else "flat"
+    gerar_pdf_agrupado(dados, elementos, styles['Normal'], group_by=group_by)
+
+    doc.build(elementos)
+
 
+# Pool de processos para a renderização (CPU-bound), criado sob demanda
+MAX_PROCESSOS_PDF = int(os.getenv("PDF_MAX_PROCESSOS", "2"))
+_pool_pdf: Optional[ProcessPoolExecutor] = None
+
+
+def obter_pool_pdf() -> ProcessPoolExecutor:
+    global _pool_pdf
+    if _pool_pdf is None:
+        _pool_pdf = ProcessPoolExecutor(max_workers=MAX_PROCESSOS_PDF)
+    return _pool_pdf
+
+
+def encerrar_pool_pdf():
+    global _pool_pdf
+    if _pool_pdf is not None:
+        _pool_pdf.shutdown(cancel_futures=True)
+        _pool_pdf = None
+
+
+def _remover_arquivo(caminho: str):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
 
 
 class ExportRequest(BaseModel):
@@ -216,13 +252,17 @@ class ExportRequest(BaseModel):
     ativo: Literal["todos", "ativos", "inativos"] = "todos"
     mandato: Literal["todos", "vigente", "encerrado"] = "todos"
     sort_by: str = "" # ex: "pessoa,asc", "cargo,desc"
+    compactar: bool = False # CSV compactado com gzip (relatorio.csv.gz)
 
 
 
     
 @router.post("/export/pdf")
-def export_pdf(req: ExportRequest, session: Session = Depends(get_session)):
-    dados = core_busca_generica(
+async def export_pdf(req: ExportRequest, session: Session = Depends(get_session)):
+    # Consulta no threadpool (sessão síncrona), renderização no pool de processos
+    # e saída em arquivo temporário: o event loop fica livre durante todo o processo.
+    dados = await run_in_threadpool(
+        core_busca_generica,
         tipo=req.tipo,
         busca=req.busca,
         ativo=req.ativo,
@@ -231,108 +271,294 @@ def export_pdf(req: ExportRequest, session: Session = Depends(get_session)):
         session=session
     )
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    elementos = []
+    descritor, caminho = tempfile.mkstemp(prefix="relatorio_", suffix=".pdf")
+    os.close(descritor)
 
-    elementos.append(Spacer(1, 3))
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(obter_pool_pdf(), renderizar_pdf, dados, req.tipo, caminho)
+    except Exception as e:
+        _remover_arquivo(caminho)
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar PDF: {e}")
 
-    if req.tipo in ("cargo", "pessoa", "orgao"):
-        gerar_pdf_agrupado(dados, elementos, styles['Normal'], group_by=req.tipo)
-    else:
-        gerar_pdf_agrupado(dados, elementos, styles['Normal'], group_by="flat")
+    return FileResponse(
+        caminho,
+        media_type="application/pdf",
+        filename="relatorio.pdf",
+        background=BackgroundTask(_remover_arquivo, caminho)
+    )
+
+
+# Cabeçalho universal do CSV
+CABECALHO_CSV = ["Pessoa", "Cargo", "Órgão", "Início", "Fim", "Mandato", "Observações"]
+
+# Tamanho aproximado (em caracteres) de cada bloco enviado ao cliente
+TAMANHO_BLOCO_CSV = 64 * 1024
 
-    doc.build(elementos)
-    buffer.seek(0)
+
+def linha_csv(r):
+    """Linha do CSV a partir de uma linha crua da busca (ver QUERY_BASE em routers/busca.py)."""
+    pessoa, cargo, orgao, data_inicio, data_fim, mandato, observacoes = r[:7]
+    exclusivo = r[9]
+    return [
+        pessoa or "",
+        cargo or "",
+        orgao or "",
+        data_inicio or "",
+        data_fim or "",
+        str(mandato) if exclusivo and mandato is not None else "",
+        observacoes or ""
+    ]
+
+
+def gerar_csv(linhas, compactar: bool = False):
+    """
+    Gera o CSV em blocos codificados conforme as linhas chegam do cursor,
+    mantendo em memória apenas o bloco atual. Com `compactar`, os blocos
+    saem como um único fluxo gzip.
+    """
+    compressor = zlib.compressobj(wbits=31) if compactar else None  # wbits=31: formato gzip
+
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def esvaziar():
+        bloco = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(bloco) if compressor else bloco
+
+    writer.writerow(CABECALHO_CSV)
+
+    for r in linhas:
+        writer.writerow(linha_csv(r))
+        if buffer.tell() >= TAMANHO_BLOCO_CSV:
+            bloco = esvaziar()
+            if bloco:
+                yield bloco
+
+    bloco = esvaziar()
+    if compressor:
+        bloco += compressor.flush()
+    if bloco:
+        yield bloco
+
+
+def arquivo_csv(compactar: bool):
+    """(nome do arquivo, media type) do CSV exportado."""
+    if compactar:
+        return "relatorio.csv.gz", "application/gzip"
+    return "relatorio.csv", "text/csv; charset=utf-8"
+
+
+@router.post("/export/csv")
+def export_csv(req: ExportRequest):
+    # A query já vem ordenada como na busca; as linhas são lidas de um cursor
+    # do servidor e escritas direto no CSV, sem montar os grupos em memória.
+    try:
+        query = montar_query_ordenada(req.tipo, req.busca, req.ativo, req.mandato, req.sort_by)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    nome_arquivo, media_type = arquivo_csv(req.compactar)
 
     return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": "attachment; filename=relatorio.pdf"}
+        gerar_csv(iterar_linhas_stream(query), compactar=req.compactar),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={nome_arquivo}"}
     )
 
 
 
+# ========= Exportação colunar (Arrow IPC / Parquet) ==========
 
-@router.post("/export/csv")
-def export_csv(req: ExportRequest, session: Session = Depends(get_session)):
+# Linhas por record batch (e por row group, no Parquet)
+TAMANHO_LOTE_ARROW = 10_000
 
-    # ========= 1) Refaz a consulta ao banco ==========
-    rows = core_busca_generica(
-        tipo=req.tipo,
-        busca=req.busca,
-        ativo=req.ativo,
-        mandato=req.mandato,
-        sort_by=req.sort_by,
-        session=session
+ARQUIVOS_COLUNARES = {
+    "arrow": ("relatorio.arrows", "application/vnd.apache.arrow.stream"),
+    "parquet": ("relatorio.parquet", "application/vnd.apache.parquet"),
+}
+
+
+def esquema_arrow():
+    """
+    Esquema das linhas de QUERY_BASE["flat"], na mesma ordem das colunas.
+    Nomes repetidos (pessoa, cargo, órgão) são codificados como dicionário.
+    """
+    nome = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("pessoa", nome),
+        ("cargo", nome),
+        ("orgao", nome),
+        ("data_inicio", pa.date32()),
+        ("data_fim", pa.date32()),
+        ("mandato", pa.int32()),
+        ("observacoes", pa.string()),
+        ("substituto_para", pa.int32()),
+        ("id_ocupacao", pa.int32()),
+        ("exclusivo", pa.bool_()),
+        ("id_cargo", pa.int32()),
+    ])
+
+
+def gerar_lotes_arrow(linhas, esquema):
+    linhas = iter(linhas)
+    while True:
+        lote = list(islice(linhas, TAMANHO_LOTE_ARROW))
+        if not lote:
+            return
+        colunas = zip(*lote)
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)],
+            schema=esquema
+        )
+
+
+def escrever_colunar(req: ExportRequest, formato: str, caminho: str):
+    """
+    Grava em `caminho` as linhas da busca (sempre no formato flat, uma por ocupação)
+    em Arrow IPC (stream) ou Parquet, lote a lote a partir do cursor do servidor.
+    Os termos da busca são interpretados conforme req.tipo, como no CSV e no PDF.
+    """
+    query = montar_query_ordenada(
+        "flat", req.busca, req.ativo, req.mandato, req.sort_by, categoria=req.tipo
     )
+    esquema = esquema_arrow()
+    lotes = gerar_lotes_arrow(iterar_linhas_stream(query), esquema)
 
-    # ========= 2) Monta o CSV ==========
-    buffer = StringIO()
-    writer = csv.writer(buffer)
+    if formato == "parquet":
+        with pq.ParquetWriter(caminho, esquema, compression="zstd") as writer:
+            for lote in lotes:
+                writer.write_batch(lote)
+    else:
+        opcoes = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.OSFile(caminho, "wb") as sink, pa.ipc.new_stream(sink, esquema, options=opcoes) as writer:
+            for lote in lotes:
+                writer.write_batch(lote)
+
+
+def _exportar_colunar(req: ExportRequest, formato: str):
+    if pa is None:
+        raise HTTPException(status_code=501, detail="Exportação colunar indisponível: instale o pacote 'pyarrow'.")
+
+    descritor, caminho = tempfile.mkstemp(prefix="relatorio_")
+    os.close(descritor)
+
+    try:
+        escrever_colunar(req, formato, caminho)
+    except Exception as e:
+        _remover_arquivo(caminho)
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar arquivo {formato}: {e}")
+
+    nome_arquivo, media_type = ARQUIVOS_COLUNARES[formato]
+    return FileResponse(
+        caminho,
+        media_type=media_type,
+        filename=nome_arquivo,
+        background=BackgroundTask(_remover_arquivo, caminho)
+    )
 
-    # Cabeçalho universal
-    writer.writerow(["Pessoa", "Cargo", "Órgão", "Início", "Fim", "Mandato", "Observações"])
 
-    if req.tipo == "flat":
-        for r in rows:
-            writer.writerow([
-                r.get("pessoa", ""), r.get("cargo", ""), r.get("orgao", ""),
-                r.get("data_inicio", "") or "", r.get("data_fim", "") or "", str(r.get("mandato", "")) if r.get("exclusivo", False) else "", r.get("observacoes", "") or ""
-            ])
+@router.post("/export/arrow")
+def export_arrow(req: ExportRequest):
+    return _exportar_colunar(req, "arrow")
+
+
+@router.post("/export/parquet")
+def export_parquet(req: ExportRequest):
+    return _exportar_colunar(req, "parquet")
+
+
+# ========= Exportações em segundo plano ==========
+
+class ExportJobRequest(ExportRequest):
+    formato: Literal["pdf", "csv", "arrow", "parquet"] = "pdf"
+
+
+# Limite do cache de arquivos exportados em disco (LRU por download)
+EXPORTACOES_TAMANHO_MAXIMO = int(os.getenv("EXPORT_CACHE_MAX_MB", "500")) * 1024 * 1024
+
+GERENCIADOR_EXPORTACOES = GerenciadorExportacoes(
+    tamanho_maximo=EXPORTACOES_TAMANHO_MAXIMO,
+    diretorio_base=os.getenv("EXPORT_CACHE_DIR") or None
+)
+
+
+def executar_exportacao(req: ExportJobRequest, job: JobExportacao, caminho: str):
+    if req.formato == "csv":
+        job.etapa = "gerando CSV"
+        query = montar_query_ordenada(req.tipo, req.busca, req.ativo, req.mandato, req.sort_by)
+        with open(caminho, "wb") as arquivo:
+            for bloco in gerar_csv(iterar_linhas_stream(query), compactar=req.compactar):
+                arquivo.write(bloco)
+        return
+
+    if req.formato in ARQUIVOS_COLUNARES:
+        job.etapa = f"gerando {req.formato}"
+        escrever_colunar(req, req.formato, caminho)
+        return
+
+    job.etapa = "consultando"
+    with Session(engine) as session:
+        dados = core_busca_generica(
+            tipo=req.tipo,
+            busca=req.busca,
+            ativo=req.ativo,
+            mandato=req.mandato,
+            sort_by=req.sort_by,
+            session=session
+        )
+
+    job.etapa = "renderizando"
+    job.progresso = 50
+    obter_pool_pdf().submit(renderizar_pdf, dados, req.tipo, caminho).result()
+
+
+@router.post("/export/jobs")
+def criar_exportacao(req: ExportJobRequest, session: Session = Depends(get_session)):
+    # Pedidos idênticos na mesma versão dos dados (e no mesmo dia, por causa
+    # dos filtros de mandato) compartilham o mesmo job e o mesmo arquivo.
+    chave = (tuple(sorted(req.model_dump().items())), versao_busca(session), date.today())
+
+    if req.formato == "csv":
+        nome_arquivo, media_type = arquivo_csv(req.compactar)
+    elif req.formato in ARQUIVOS_COLUNARES:
+        if pa is None:
+            raise HTTPException(status_code=501, detail="Exportação colunar indisponível: instale o pacote 'pyarrow'.")
+        nome_arquivo, media_type = ARQUIVOS_COLUNARES[req.formato]
     else:
-        if req.tipo == "cargo":
-            for cargo in rows:
-                chave = (cargo.get("cargo", ""), cargo.get("orgao", ""))
-                ocupacoes = cargo.get("ocupacoes", [])
-                for oc in ocupacoes:
-                    writer.writerow([
-                        oc.get("pessoa", ""),
-                        chave[0],
-                        chave[1],
-                        oc.get("data_inicio", "") or "",
-                        oc.get("data_fim", "") or "",
-                        str(oc.get("mandato", "")) if oc.get("exclusivo", False) else "",
-                        oc.get("observacoes", "") 
-                    ])
-
-        elif req.tipo == "pessoa":
-            for pessoa in rows:
-                chave = pessoa.get("pessoa", "")
-                ocupacoes = pessoa.get("cargos", [])
-                for oc in ocupacoes:
-                    writer.writerow([
-                        chave,
-                        oc.get("cargo", ""),
-                        oc.get("orgao", ""),
-                        oc.get("data_inicio", "") or "",
-                        oc.get("data_fim", "") or "",
-                        str(oc.get("mandato", "")) if oc.get("exclusivo", False) else "",
-                        oc.get("observacoes", "") 
-                    ])
-
-        elif req.tipo == "orgao":
-            for orgao in rows:
-                chave = orgao.get("orgao", "")
-                ocupacoes = orgao.get("cargos", [])
-                for oc in ocupacoes:
-                    writer.writerow([
-                        oc.get("pessoa", ""),
-                        oc.get("cargo", ""),
-                        chave,
-                        oc.get("data_inicio", "") or "",
-                        oc.get("data_fim", "") or "",
-                        str(oc.get("mandato", "")) if oc.get("exclusivo", False) else "",
-                        oc.get("observacoes", "") 
-                    ])
-
-    # ========= 3) Retorno como arquivo ==========
-    buffer.seek(0)
+        nome_arquivo, media_type = "relatorio.pdf", "application/pdf"
 
-    return StreamingResponse(
-        buffer,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=relatorio.csv"}
+    job = GERENCIADOR_EXPORTACOES.submeter(
+        chave,
+        lambda job, caminho: executar_exportacao(req, job, caminho),
+        nome_arquivo=nome_arquivo,
+        media_type=media_type
     )
+    return job.resumo()
+
+
+def _obter_job(id_job: str) -> JobExportacao:
+    job = GERENCIADOR_EXPORTACOES.obter(id_job)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Exportação não encontrada.")
+    return job
+
+
+@router.get("/export/jobs/{id_job}")
+def status_exportacao(id_job: str = Path(..., description="ID retornado por POST /export/jobs")):
+    return _obter_job(id_job).resumo()
+
+
+@router.get("/export/jobs/{id_job}/file")
+def baixar_exportacao(id_job: str = Path(..., description="ID retornado por POST /export/jobs")):
+    job = _obter_job(id_job)
+
+    if job.estado == "erro":
+        raise HTTPException(status_code=500, detail=f"Erro na exportação: {job.erro}")
+    if job.estado != "concluido":
+        raise HTTPException(status_code=409, detail="Exportação ainda não concluída.")
 
+    GERENCIADOR_EXPORTACOES.registrar_download(job.id)
+    return FileResponse(job.caminho, media_type=job.media_type, filename=job.nome_arquivo)
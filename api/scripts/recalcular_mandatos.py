@@ -0,0 +1,43 @@
+"""
+Recalcula a numeração de mandatos (Ocupacao.mandato) direto no banco,
+por exemplo após importações ou edições manuais.
+
+Uso (a partir da pasta api/):
+    python -m scripts.recalcular_mandatos                 # todos os cargos
+    python -m scripts.recalcular_mandatos --cargo 12
+    python -m scripts.recalcular_mandatos --orgao 3 --simular
+
+Não é preciso reiniciar a API: o cache de linhas do tempo confere cada cargo com o
+banco a cada leitura (utils/linha_do_tempo.py) e as entradas expiram em minutos.
+"""
+import argparse
+
+from sqlmodel import Session
+
+from database import engine
+from routers.ocupacao import core_recalcular_mandatos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula os mandatos consecutivos das ocupações.")
+    escopo = parser.add_mutually_exclusive_group()
+    escopo.add_argument("--cargo", type=int, help="ID do cargo")
+    escopo.add_argument("--orgao", type=int, help="ID do órgão (todos os seus cargos)")
+    parser.add_argument("--simular", action="store_true", help="Apenas lista as alterações, sem gravar")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        resultado = core_recalcular_mandatos(
+            session, id_cargo=args.cargo, id_orgao=args.orgao, simular=args.simular
+        )
+        session.commit()
+
+    for alteracao in resultado["alteracoes"]:
+        print(f"ocupação {alteracao['id_ocupacao']}: mandato {alteracao['mandato_anterior']} -> {alteracao['mandato']}")
+
+    acao = "seriam alteradas" if args.simular else "alteradas"
+    print(f"{resultado['alteradas']} ocupações {acao}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,14 @@
 grammar = r"""
 ?start: expr
 
-?expr: expr "OR" term   -> or_expr
-     | expr "AND" term  -> and_expr
+// Precedência explícita (NOT > AND > OR) para que a gramática seja LALR(1)
+?expr: expr "OR" and_term   -> or_expr
+     | and_term
+
+?and_term: and_term "AND" term  -> and_expr
      | term
 
 ?term: "NOT" term       -> not_expr
-     | expr    
      | "(" expr ")"     -> grouped
      | filtro      
 
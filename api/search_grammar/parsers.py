@@ -1,19 +1,38 @@
+from functools import lru_cache
+
 from lark import Lark
-from sqlmodel import case, select, and_, or_, not_
+from sqlmodel import func, select, and_, or_, not_
 
 from models.pessoa import Pessoa
 from models.cargo import Cargo
 from models.orgao import Orgao
 from models.ocupacao import Ocupacao
+from models.incumbencia import Incumbencia
 from search_grammar.grammar import grammar
 from search_grammar.transformer import FiltroTransformer
 
 
+# Campos textuais com índice trigram sobre normalizar_nome(nome) (ver upgrade.sql)
+CAMPOS_NOME = {"pessoa", "cargo", "orgao"}
+
+# Parser compilado uma única vez na importação do módulo.
+# Com LALR o Lark consegue guardar as tabelas em disco (cache=True), então
+# só o primeiro start da aplicação paga pela compilação da gramática.
+PARSER = Lark(grammar, start="start", parser="lalr", cache=True)
+
+TAMANHO_CACHE_FILTROS = 1024
+
+
 # Exporta o transformer e parser para uso em outras partes do sistema
+@lru_cache(maxsize=TAMANHO_CACHE_FILTROS)
 def parse_filtro(filtro, categoria_atual="pessoa"):
-    parser = Lark(grammar, start="start")
+    """
+    Faz o parsing do filtro e retorna o dicionário lógico já transformado.
+    O resultado é cacheado por (filtro, categoria_atual) e é compartilhado entre
+    chamadas, portanto não deve ser alterado por quem o consome.
+    """
     transformer = FiltroTransformer(categoria_atual=categoria_atual)
-    tree = parser.parse(filtro)
+    tree = PARSER.parse(filtro)
     return transformer.transform(tree)
 
 def traduzir_parsing_result(parse_result):
@@ -31,30 +50,22 @@ def traduzir_parsing_result(parse_result):
         if( "ELECTABLE TO" in parse_result):
             # Todas as pessoas que podem ser eleitas para o cargo X do órgão Y
             # Condição: Pessoas não são elegíveis se o o último mandato daquele cargo naquele órgão é delas e se este mandato é o segundo consecutivo.
+            # O titular atual de cada cargo é mantido pelo banco na tabela Incumbencia (ver upgrade.sql),
+            # então o filtro vira um anti-join indexado.
             valor1 = parse_result["ELECTABLE TO"]["campo1"]
             valor2 = parse_result["ELECTABLE TO"]["campo2"]
 
-            ultima_ocupacao = (
-                select(Ocupacao.id_pessoa)
-                .join(Cargo, Ocupacao.id_cargo == Cargo.id_cargo)
+            condicao_ineligivel = (
+                select(Incumbencia.id_cargo)
+                .join(Cargo, Incumbencia.id_cargo == Cargo.id_cargo)
                 .join(Orgao, Cargo.id_orgao == Orgao.id_orgao)
-                .where(and_(Cargo.nome == valor1, Orgao.nome == valor2, Ocupacao.mandato >= 2, Pessoa.ativo == True))
-                # data_fim nula significa vigente, então tratamos como "mais recente"
-                .order_by(
-                    case(
-                        (Ocupacao.data_fim.is_(None), 1),  # os vigentes vêm primeiro
-                        else_=0
-                    ).desc(),
-                    Ocupacao.data_fim.desc()               # senão, pega o mais recente
-                )
-                .limit(1)
-            ).subquery()
-
-
-            # Condição de inelegibilidade:
-            # se o último mandato é dessa pessoa e é o segundo consecutivo
-            condicao_ineligivel = Ocupacao.id_pessoa.in_(ultima_ocupacao)
-    
+                .where(and_(
+                    Cargo.nome == valor1,
+                    Orgao.nome == valor2,
+                    Incumbencia.id_pessoa == Pessoa.id_pessoa,
+                    Incumbencia.mandatos_consecutivos >= 2
+                ))
+            ).exists()
 
             # Resultado final: quem é elegível
             return not_(condicao_ineligivel)
@@ -86,7 +97,11 @@ def traduzir_parsing_result(parse_result):
                 # *** CORREÇÃO AQUI: Implementação do LIKE usando ilike (case-insensitive) e curingas (%) ***
                 if not isinstance(valor, str):
                     raise TypeError("O operador 'LIKE' só pode ser usado com valores de string.")
-                
+
+                if campo in CAMPOS_NOME:
+                    # Comparação acento-insensível servida pelos índices GIN (pg_trgm) de upgrade.sql
+                    return func.normalizar_nome(coluna).contains(func.normalizar_nome(valor))
+
                 return coluna.ilike(f"%{valor}%")
             
             case "<":
@@ -0,0 +1,123 @@
+"""
+Exportação colunar (Parquet): as linhas são sempre flat, mas os termos da busca
+são interpretados conforme o tipo pedido, como na busca, no CSV e no PDF.
+
+Roda sobre SQLite em memória (normalizar_nome é registrada como lower()).
+
+    cd api && python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# database.py monta a URL do PostgreSQL na importação (sem conectar)
+for variavel, valor in (("PG_USER", "teste"), ("PG_PASSWORD", "teste"), ("PG_HOST", "localhost"),
+                        ("PG_PORT", "5432"), ("PG_DBNAME", "teste"), ("SECRET_KEY", "teste")):
+    os.environ.setdefault(variavel, valor)
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+import models.historico  # noqa: F401  (tabelas usadas pelo histórico e pelas notificações)
+import models.notificacoes  # noqa: F401
+from models.cargo import Cargo
+from models.ocupacao import Ocupacao
+from models.orgao import Orgao
+from models.pessoa import Pessoa
+from routers import busca as rotas_busca
+from routers.relatorio import ExportRequest, escrever_colunar, pq
+from routers.busca import CACHE_BUSCA, core_busca_generica
+
+
+@unittest.skipIf(pq is None, "pyarrow não instalado")
+class ExportacaoParquetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+        )
+
+        @event.listens_for(self.engine, "connect")
+        def registrar_funcoes(conexao, _):
+            conexao.create_function("normalizar_nome", 1, lambda t: None if t is None else t.lower())
+
+        SQLModel.metadata.create_all(self.engine)
+        CACHE_BUSCA.limpar()
+        # iterar_linhas_stream abre a própria sessão no engine do módulo
+        self.engine_original = rotas_busca.engine
+        rotas_busca.engine = self.engine
+
+        with Session(self.engine) as session:
+            orgaos = [Orgao(nome=f"Órgão {i}", ativo=True) for i in range(2)]
+            session.add_all(orgaos)
+            session.flush()
+
+            cargos = [
+                Cargo(nome=nome, id_orgao=orgao.id_orgao, exclusivo=True, ativo=True)
+                for orgao in orgaos for nome in ("Diretor", "Conselheiro")
+            ]
+            session.add_all(cargos)
+            pessoas = [Pessoa(nome=nome, ativo=True) for nome in ("Ana Diretor", "Bruno", "Carla", "Diego")]
+            session.add_all(pessoas)
+            session.flush()
+
+            for i, (pessoa, cargo) in enumerate(zip(pessoas, cargos)):
+                session.add(Ocupacao(
+                    id_pessoa=pessoa.id_pessoa, id_cargo=cargo.id_cargo,
+                    data_inicio=date(2020 + i, 1, 1), mandato=1
+                ))
+            # Segunda ocupação do primeiro Diretor, por quem tem "Diretor" no nome
+            session.add(Ocupacao(
+                id_pessoa=pessoas[0].id_pessoa, id_cargo=cargos[0].id_cargo,
+                data_inicio=date(2018, 1, 1), data_fim=date(2019, 12, 31), mandato=1
+            ))
+            session.commit()
+
+    def tearDown(self):
+        rotas_busca.engine = self.engine_original
+        CACHE_BUSCA.limpar()
+
+    def _exportar(self, req: ExportRequest):
+        descritor, caminho = tempfile.mkstemp(suffix=".parquet")
+        os.close(descritor)
+        try:
+            escrever_colunar(req, "parquet", caminho)
+            return pq.read_table(caminho).to_pylist()
+        finally:
+            os.remove(caminho)
+
+    def _ocupacoes_da_busca(self, req: ExportRequest):
+        with Session(self.engine) as session:
+            grupos = core_busca_generica(
+                session=session, tipo=req.tipo, busca=req.busca,
+                ativo=req.ativo, mandato=req.mandato, sort_by=req.sort_by
+            )
+        return {
+            ocupacao["id_ocupacao"]
+            for grupo in grupos for ocupacao in grupo["ocupacoes"]
+            if ocupacao["id_ocupacao"] is not None
+        }
+
+    def test_termo_sem_campo_segue_o_tipo(self):
+        req = ExportRequest(tipo="cargo", busca='"Diretor"')
+
+        linhas = self._exportar(req)
+
+        self.assertEqual({linha["cargo"] for linha in linhas}, {"Diretor"})
+        self.assertEqual({linha["id_ocupacao"] for linha in linhas}, self._ocupacoes_da_busca(req))
+        self.assertEqual(len(linhas), 3)
+
+    def test_flat_continua_buscando_por_pessoa(self):
+        linhas = self._exportar(ExportRequest(tipo="flat", busca='"Diretor"'))
+
+        self.assertEqual({linha["pessoa"] for linha in linhas}, {"Ana Diretor"})
+        self.assertEqual(len(linhas), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+"""
+Finalização com substituição automática numa cadeia de cargos exclusivos (A <- B <- C).
+
+Roda sobre SQLite em memória; a restrição ocupacao_exclusiva_sem_sobreposicao só existe
+no PostgreSQL, então o teste verifica o mesmo predicado que ela impõe: ocupações de um
+cargo exclusivo não se sobrepõem com os períodos fechados nas duas pontas ('[]').
+
+    cd api && python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# database.py monta a URL do PostgreSQL na importação (sem conectar)
+for variavel, valor in (("PG_USER", "teste"), ("PG_PASSWORD", "teste"), ("PG_HOST", "localhost"),
+                        ("PG_PORT", "5432"), ("PG_DBNAME", "teste"), ("SECRET_KEY", "teste")):
+    os.environ.setdefault(variavel, valor)
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+import models.historico  # noqa: F401  (tabelas usadas pelo histórico e pelas notificações)
+import models.notificacoes  # noqa: F401
+from models.cargo import Cargo
+from models.ocupacao import Ocupacao
+from models.orgao import Orgao
+from models.pessoa import Pessoa
+from routers import ocupacao as rotas_ocupacao
+from routers.ocupacao import FinalizarOcupacaoRequest, finalizar_ocupacao, finalizar_ocupacoes_orgao
+from utils.linha_do_tempo import CACHE_LINHAS_DO_TEMPO
+
+DATA_FIM = date(2025, 6, 30)
+
+
+def _sobrepoe(a: Ocupacao, b: Ocupacao) -> bool:
+    inicio_a, fim_a = a.data_inicio or date.min, a.data_fim or date.max
+    inicio_b, fim_b = b.data_inicio or date.min, b.data_fim or date.max
+    return inicio_a <= fim_b and inicio_b <= fim_a
+
+
+class FinalizarComSubstituicaoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+        )
+        SQLModel.metadata.create_all(self.engine)
+        CACHE_LINHAS_DO_TEMPO.limpar()
+        # Sem a restrição no banco, a regra 1 é verificada em memória
+        rotas_ocupacao._restricao_exclusividade = False
+
+        with Session(self.engine) as session:
+            orgao = Orgao(nome="Conselho", ativo=True)
+            session.add(orgao)
+            session.flush()
+
+            a, b, c = (Cargo(nome=nome, id_orgao=orgao.id_orgao, exclusivo=True, ativo=True) for nome in "ABC")
+            session.add_all([a, b, c])
+            session.flush()
+            a.substituto, b.substituto_para = b.id_cargo, a.id_cargo
+            b.substituto, c.substituto_para = c.id_cargo, b.id_cargo
+
+            pessoas = [Pessoa(nome=f"Pessoa {i}", ativo=True) for i in range(3)]
+            session.add_all(pessoas)
+            session.flush()
+
+            for pessoa, cargo in zip(pessoas, (a, b, c)):
+                session.add(Ocupacao(
+                    id_pessoa=pessoa.id_pessoa, id_cargo=cargo.id_cargo,
+                    data_inicio=date(2024, 1, 1), mandato=1
+                ))
+            session.commit()
+
+            self.id_orgao = orgao.id_orgao
+            self.ids_cargos = [a.id_cargo, b.id_cargo, c.id_cargo]
+            self.ids_pessoas = [p.id_pessoa for p in pessoas]
+
+    def tearDown(self):
+        CACHE_LINHAS_DO_TEMPO.limpar()
+        rotas_ocupacao._restricao_exclusividade = None
+
+    def _verificar_cadeia(self, session: Session, data_inicio_substitutos: date):
+        a, b, c = self.ids_cargos
+        p0, p1, p2 = self.ids_pessoas
+        ocupacoes = session.exec(select(Ocupacao).order_by(Ocupacao.id_ocupacao)).all()
+
+        # As três ocupações originais terminam em DATA_FIM
+        self.assertEqual([o.data_fim for o in ocupacoes[:3]], [DATA_FIM] * 3)
+
+        # B assume A e C assume B
+        novas = sorted((o.id_pessoa, o.id_cargo, o.data_inicio) for o in ocupacoes[3:])
+        self.assertEqual(novas, sorted([
+            (p1, a, data_inicio_substitutos),
+            (p2, b, data_inicio_substitutos),
+        ]))
+
+        # Mesmo predicado da restrição de exclusão
+        for id_cargo in self.ids_cargos:
+            do_cargo = [o for o in ocupacoes if o.id_cargo == id_cargo]
+            for i, primeira in enumerate(do_cargo):
+                for segunda in do_cargo[i + 1:]:
+                    self.assertFalse(
+                        _sobrepoe(primeira, segunda),
+                        f"ocupações {primeira.id_ocupacao} e {segunda.id_ocupacao} se sobrepõem"
+                    )
+
+    def test_substitutos_comecam_no_dia_seguinte(self):
+        with Session(self.engine) as session:
+            id_titular = session.exec(
+                select(Ocupacao.id_ocupacao).where(Ocupacao.id_cargo == self.ids_cargos[0])
+            ).one()
+
+            resposta = finalizar_ocupacao(
+                id_titular, FinalizarOcupacaoRequest(definitiva=False, data_fim=DATA_FIM), session
+            )
+
+            self.assertEqual(resposta["status"], "success")
+            self.assertEqual(len(resposta["ids"]), 2)
+            self._verificar_cadeia(session, DATA_FIM + timedelta(days=1))
+
+    def test_data_inicio_informada_e_respeitada(self):
+        data_inicio = date(2025, 8, 1)
+        with Session(self.engine) as session:
+            id_titular = session.exec(
+                select(Ocupacao.id_ocupacao).where(Ocupacao.id_cargo == self.ids_cargos[0])
+            ).one()
+
+            finalizar_ocupacao(
+                id_titular,
+                FinalizarOcupacaoRequest(definitiva=False, data_fim=DATA_FIM, data_inicio_substitutos=data_inicio),
+                session
+            )
+
+            self._verificar_cadeia(session, data_inicio)
+
+    def test_finalizacao_do_orgao(self):
+        with Session(self.engine) as session:
+            resposta = finalizar_ocupacoes_orgao(
+                self.id_orgao, FinalizarOcupacaoRequest(definitiva=False, data_fim=DATA_FIM), session
+            )
+
+            self.assertEqual(len(resposta["finalizadas"]), 3)
+            self.assertEqual(len(resposta["ids"]), 2)
+            self._verificar_cadeia(session, DATA_FIM + timedelta(days=1))
+
+    def test_violacao_de_restricao_vira_409_e_desfaz(self):
+        class ErroExclusao(Exception):
+            pgcode = "23P01"
+
+        def inserir_com_violacao(session, cadeias, payload):
+            raise IntegrityError("INSERT INTO ocupacao ...", {}, ErroExclusao())
+
+        original = rotas_ocupacao._inserir_substituicoes
+        rotas_ocupacao._inserir_substituicoes = inserir_com_violacao
+        try:
+            with Session(self.engine) as session:
+                id_titular = session.exec(
+                    select(Ocupacao.id_ocupacao).where(Ocupacao.id_cargo == self.ids_cargos[0])
+                ).one()
+
+                with self.assertRaises(HTTPException) as erro:
+                    finalizar_ocupacao(
+                        id_titular, FinalizarOcupacaoRequest(definitiva=False, data_fim=DATA_FIM), session
+                    )
+                self.assertEqual(erro.exception.status_code, 409)
+
+                # O UPDATE das ocupações da cadeia foi desfeito
+                self.assertEqual(session.exec(select(Ocupacao.data_fim)).all(), [None] * 3)
+        finally:
+            rotas_ocupacao._inserir_substituicoes = original
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+-- Script executado a cada inicialização da API (ver database.init_db).
+-- Todas as instruções devem ser idempotentes.
+
+------------------------
+-- Busca por substring acento-insensível (pg_trgm + unaccent)
+------------------------
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() não é IMMUTABLE, então não pode ser usada diretamente em índices.
+-- Fixando o dicionário, o resultado passa a depender apenas da entrada.
+CREATE OR REPLACE FUNCTION normalizar_nome(texto TEXT)
+RETURNS TEXT AS $$
+    SELECT lower(public.unaccent('public.unaccent'::regdictionary, texto));
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+CREATE INDEX IF NOT EXISTS idx_pessoa_nome_normalizado_trgm
+    ON Pessoa USING GIN (normalizar_nome(nome) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_cargo_nome_normalizado_trgm
+    ON Cargo USING GIN (normalizar_nome(nome) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_orgao_nome_normalizado_trgm
+    ON Orgao USING GIN (normalizar_nome(nome) gin_trgm_ops);
+
+------------------------
+-- Incumbência: titular atual de cada cargo e seus mandatos consecutivos
+------------------------
+
+-- Índice usado para localizar a ocupação mais recente de um cargo
+CREATE INDEX IF NOT EXISTS idx_ocupacao_cargo_inicio
+    ON Ocupacao (id_cargo, data_inicio DESC NULLS LAST, id_ocupacao DESC);
+
+CREATE TABLE IF NOT EXISTS Incumbencia (
+    id_cargo INTEGER PRIMARY KEY REFERENCES Cargo (id_cargo) ON DELETE CASCADE,
+    id_pessoa INTEGER NOT NULL REFERENCES Pessoa (id_pessoa),
+    id_ocupacao INTEGER NOT NULL REFERENCES Ocupacao (id_ocupacao) ON DELETE CASCADE,
+    mandatos_consecutivos INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_incumbencia_pessoa
+    ON Incumbencia (id_pessoa, mandatos_consecutivos);
+
+CREATE OR REPLACE FUNCTION recalcular_incumbencia(p_id_cargo INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM Incumbencia WHERE id_cargo = p_id_cargo;
+
+    INSERT INTO Incumbencia (id_cargo, id_pessoa, id_ocupacao, mandatos_consecutivos)
+    SELECT id_cargo, id_pessoa, id_ocupacao, mandato
+    FROM Ocupacao
+    WHERE id_cargo = p_id_cargo
+    ORDER BY data_inicio DESC NULLS LAST, id_ocupacao DESC
+    LIMIT 1;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION atualizar_incumbencia()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM recalcular_incumbencia(OLD.id_cargo);
+    END IF;
+
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.id_cargo <> OLD.id_cargo) THEN
+        PERFORM recalcular_incumbencia(NEW.id_cargo);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_incumbencia ON Ocupacao;
+CREATE TRIGGER update_incumbencia
+AFTER INSERT OR UPDATE OR DELETE ON Ocupacao
+FOR EACH ROW
+EXECUTE FUNCTION atualizar_incumbencia();
+
+-- Carga inicial / reparo (idempotente)
+INSERT INTO Incumbencia (id_cargo, id_pessoa, id_ocupacao, mandatos_consecutivos)
+SELECT DISTINCT ON (id_cargo) id_cargo, id_pessoa, id_ocupacao, mandato
+FROM Ocupacao
+ORDER BY id_cargo, data_inicio DESC NULLS LAST, id_ocupacao DESC
+ON CONFLICT (id_cargo) DO UPDATE
+SET id_pessoa = EXCLUDED.id_pessoa,
+    id_ocupacao = EXCLUDED.id_ocupacao,
+    mandatos_consecutivos = EXCLUDED.mandatos_consecutivos;
+
+------------------------
+-- Cargos exclusivos: ocupações sem sobreposição garantidas pelo banco (btree_gist)
+------------------------
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Restrições de exclusão só enxergam a própria linha: a flag do cargo é copiada para a ocupação
+ALTER TABLE Ocupacao ADD COLUMN IF NOT EXISTS cargo_exclusivo BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE OR REPLACE FUNCTION copiar_cargo_exclusivo()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.cargo_exclusivo := COALESCE(
+        (SELECT exclusivo FROM Cargo WHERE id_cargo = NEW.id_cargo),
+        FALSE
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_ocupacao_cargo_exclusivo ON Ocupacao;
+CREATE TRIGGER update_ocupacao_cargo_exclusivo
+BEFORE INSERT OR UPDATE OF id_cargo ON Ocupacao
+FOR EACH ROW
+EXECUTE FUNCTION copiar_cargo_exclusivo();
+
+CREATE OR REPLACE FUNCTION propagar_cargo_exclusivo()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE Ocupacao
+    SET cargo_exclusivo = COALESCE(NEW.exclusivo, FALSE)
+    WHERE id_cargo = NEW.id_cargo;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_cargo_exclusivo ON Cargo;
+CREATE TRIGGER update_cargo_exclusivo
+AFTER UPDATE OF exclusivo ON Cargo
+FOR EACH ROW
+WHEN (OLD.exclusivo IS DISTINCT FROM NEW.exclusivo)
+EXECUTE FUNCTION propagar_cargo_exclusivo();
+
+-- Carga inicial / reparo (idempotente)
+UPDATE Ocupacao o
+SET cargo_exclusivo = COALESCE(c.exclusivo, FALSE)
+FROM Cargo c
+WHERE c.id_cargo = o.id_cargo
+  AND o.cargo_exclusivo IS DISTINCT FROM COALESCE(c.exclusivo, FALSE);
+
+-- Datas nulas viram limites abertos; o índice GiST da restrição atende também à busca do conflito.
+-- Se os dados existentes já violarem a regra, a restrição não é criada (a API volta à checagem prévia)
+-- e ela é tentada de novo na próxima inicialização.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'ocupacao_exclusiva_sem_sobreposicao') THEN
+        ALTER TABLE Ocupacao ADD CONSTRAINT ocupacao_exclusiva_sem_sobreposicao
+            EXCLUDE USING gist (
+                id_cargo WITH =,
+                daterange(data_inicio, data_fim, '[]') WITH &&
+            )
+            WHERE (cargo_exclusivo);
+    END IF;
+EXCEPTION
+    WHEN exclusion_violation OR data_exception THEN
+        RAISE WARNING USING MESSAGE =
+            'Restrição ocupacao_exclusiva_sem_sobreposicao não criada: há ocupações sobrepostas ou com datas invertidas em cargos exclusivos (' || SQLERRM || ').';
+END;
+$$;
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Hashable
+
+
+class CacheVersionado:
+    """
+    Cache LRU em memória, com tamanho limitado. Uma entrada só é válida enquanto
+    a versão informada pelo chamador não mudar e no mesmo dia em que foi calculada
+    (consultas com current_date mudam de resultado à meia-noite).
+    A versão deve vir do banco (ex.: utils.etag.calcular_validador), e não de um
+    contador do processo, para que escritas de outros processos também invalidem.
+    Os valores são compartilhados entre chamadas e não devem ser alterados.
+    """
+
+    def __init__(self, capacidade: int = 128):
+        self.capacidade = capacidade
+        self.hits = 0
+        self.misses = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave: Hashable, versao: Hashable, calcular: Callable[[], Any]) -> Any:
+        hoje = date.today()
+
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] == versao and entrada[1] == hoje:
+                self._entradas.move_to_end(chave)
+                self.hits += 1
+                return entrada[2]
+            self.misses += 1
+
+        # Calcula fora do lock; com a versão lida antes da consulta, um resultado calculado
+        # durante uma escrita pode ser mais novo que a versão, mas nunca mais antigo.
+        valor = calcular()
+
+        with self._lock:
+            self._entradas[chave] = (versao, hoje, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "tamanho": len(self._entradas),
+                "capacidade": self.capacidade,
+            }
@@ -0,0 +1,66 @@
+from typing import List
+
+from sqlalchemy import literal
+from sqlmodel import Session, select
+
+from models.cargo import Cargo
+
+# Limite de segurança da recursão, caso os dados contenham um ciclo
+PROFUNDIDADE_MAXIMA = 100
+
+
+def cte_cadeia(ligacao, *condicoes_iniciais):
+    """
+    CTE recursiva "cadeia" (raiz, id_cargo, proximo, nivel): os cargos que atendem às
+    condições iniciais (nivel 0, raiz = o próprio cargo) e os seguintes de cada um ao
+    longo de `ligacao` (Cargo.substituto para baixo, Cargo.substituto_para para cima).
+    """
+    cadeia = (
+        select(
+            Cargo.id_cargo.label("raiz"),
+            Cargo.id_cargo,
+            ligacao.label("proximo"),
+            literal(0).label("nivel")
+        )
+        .where(*condicoes_iniciais)
+        .cte("cadeia", recursive=True)
+    )
+    return cadeia.union_all(
+        select(cadeia.c.raiz, Cargo.id_cargo, ligacao, cadeia.c.nivel + 1)
+        .join(cadeia, Cargo.id_cargo == cadeia.c.proximo)
+        .where(cadeia.c.nivel < PROFUNDIDADE_MAXIMA)
+    )
+
+
+def _cadeia(session: Session, id_cargo: int, ligacao) -> List[Cargo]:
+    """
+    Percorre a cadeia de substituição a partir do cargo com uma única consulta
+    WITH RECURSIVE. Retorna os cargos em ordem de distância, sem o inicial.
+    """
+    cadeia = cte_cadeia(ligacao, Cargo.id_cargo == id_cargo)
+
+    linhas = session.exec(
+        select(Cargo)
+        .join(cadeia, Cargo.id_cargo == cadeia.c.id_cargo)
+        .where(cadeia.c.nivel > 0)
+        .order_by(cadeia.c.nivel)
+    ).all()
+
+    # Num ciclo, a recursão repete cargos até o limite: para na primeira repetição
+    cargos, vistos = [], {id_cargo}
+    for cargo in linhas:
+        if cargo.id_cargo in vistos:
+            break
+        vistos.add(cargo.id_cargo)
+        cargos.append(cargo)
+    return cargos
+
+
+def cadeia_abaixo(session: Session, id_cargo: int) -> List[Cargo]:
+    """Substitutos do cargo, do imediato ao último: [sub1, sub2, ...]."""
+    return _cadeia(session, id_cargo, Cargo.substituto)
+
+
+def cadeia_acima(session: Session, id_cargo: int) -> List[Cargo]:
+    """Cargos que o cargo substitui, do imediato ao titular da cadeia."""
+    return _cadeia(session, id_cargo, Cargo.substituto_para)
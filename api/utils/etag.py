@@ -0,0 +1,61 @@
+import hashlib
+from datetime import date
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlmodel import Session, func, select
+
+
+def calcular_validador(session: Session, *modelos, extra: str = ""):
+    """
+    Validador barato do estado das tabelas: count(*) e max(updated_at) de cada
+    modelo, numa única consulta (updated_at é mantido pelos triggers de schema.sql).
+    Retorna o ETag (fraco).
+    """
+    colunas = []
+    for modelo in modelos:
+        colunas.append(select(func.count()).select_from(modelo).scalar_subquery())
+        colunas.append(select(func.max(modelo.updated_at)).scalar_subquery())
+
+    valores = session.exec(select(*colunas)).one()
+
+    assinatura = "|".join(str(v) for v in valores) + "|" + extra
+    return 'W/"' + hashlib.sha1(assinatura.encode()).hexdigest() + '"'
+
+
+def _etag_confere(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Comparação fraca: ignora o prefixo W/
+    alvo = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == alvo for tag in if_none_match.split(","))
+
+
+def resposta_condicional(
+    request: Request,
+    response: Response,
+    session: Session,
+    *modelos,
+    depende_da_data: bool = False
+) -> Optional[Response]:
+    """
+    Calcula o ETag para os modelos informados e o adiciona em `response`.
+    Se o cliente já possui a versão atual (If-None-Match), retorna uma resposta 304
+    que o endpoint deve devolver sem executar a consulta principal.
+    Com depende_da_data=True, o validador muda a cada dia (filtros com current_date).
+    Não há Last-Modified / If-Modified-Since: max(updated_at) não muda quando uma
+    linha é removida e tem precisão de segundos; só o ETag (que inclui a contagem)
+    identifica a versão com segurança.
+    """
+    etag = calcular_validador(
+        session, *modelos, extra=date.today().isoformat() if depende_da_data else ""
+    )
+
+    headers = {"ETag": etag}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_confere(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
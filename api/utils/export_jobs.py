@@ -0,0 +1,181 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, Optional
+
+
+class JobExportacao:
+    """Estado de uma exportação executada em segundo plano."""
+
+    def __init__(self, id: str, nome_arquivo: str, media_type: str):
+        self.id = id
+        self.nome_arquivo = nome_arquivo
+        self.media_type = media_type
+        self.estado = "pendente"  # pendente | executando | concluido | erro
+        self.etapa: Optional[str] = None
+        self.progresso = 0
+        self.erro: Optional[str] = None
+        self.caminho: Optional[str] = None
+        self.tamanho = 0
+        self.criado_em = datetime.now()
+        self.concluido_em: Optional[datetime] = None
+
+    def resumo(self) -> dict:
+        return {
+            "id": self.id,
+            "estado": self.estado,
+            "etapa": self.etapa,
+            "progresso": self.progresso,
+            "erro": self.erro,
+            "arquivo": self.nome_arquivo,
+            "tamanho": self.tamanho,
+            "criado_em": self.criado_em,
+            "concluido_em": self.concluido_em,
+        }
+
+
+class GerenciadorExportacoes:
+    """
+    Executa exportações em segundo plano e guarda os arquivos gerados em disco.
+    Pedidos com a mesma chave resolvem para o mesmo job (e o mesmo arquivo);
+    a chave deve incluir tudo de que o resultado depende (parâmetros, versão dos dados, data).
+    Os arquivos concluídos formam um cache LRU limitado em bytes: ao passar do limite,
+    os menos baixados recentemente são apagados e seus jobs esquecidos.
+    Jobs com erro não geram arquivo: ficam consultáveis por `validade_erros` e no
+    máximo `max_erros` deles são mantidos (os mais antigos são esquecidos antes).
+    """
+
+    def __init__(
+        self,
+        tamanho_maximo: int,
+        max_workers: int = 2,
+        diretorio_base: Optional[str] = None,
+        max_erros: int = 100,
+        validade_erros: timedelta = timedelta(hours=1)
+    ):
+        self.tamanho_maximo = tamanho_maximo
+        self.diretorio_base = diretorio_base
+        self.max_erros = max_erros
+        self.validade_erros = validade_erros
+        self._diretorio: Optional[str] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="exportacao")
+        self._jobs: Dict[str, JobExportacao] = {}
+        self._arquivos = OrderedDict()  # id -> tamanho, do menos para o mais recente
+        self._erros = OrderedDict()  # id -> momento da falha, do mais antigo para o mais recente
+        self._lock = threading.Lock()
+
+    def _obter_diretorio(self) -> str:
+        # Diretório próprio do processo: os jobs vivem só em memória, então arquivos
+        # de execuções anteriores nunca são reaproveitados (nem ficam órfãos no diretório).
+        if self._diretorio is None:
+            if self.diretorio_base:
+                os.makedirs(self.diretorio_base, exist_ok=True)
+            self._diretorio = tempfile.mkdtemp(prefix="exportacoes_", dir=self.diretorio_base)
+        return self._diretorio
+
+    def submeter(
+        self,
+        chave: Hashable,
+        executar: Callable[[JobExportacao, str], None],
+        nome_arquivo: str,
+        media_type: str
+    ) -> JobExportacao:
+        """
+        Retorna o job da chave, criando-o se não existir (ou se o anterior falhou).
+        `executar(job, caminho)` deve gravar o resultado em `caminho` e pode
+        atualizar job.etapa / job.progresso.
+        """
+        id_job = hashlib.sha1(repr(chave).encode()).hexdigest()[:20]
+
+        with self._lock:
+            self._remover_erros()
+            job = self._jobs.get(id_job)
+            if job is not None and job.estado != "erro":
+                return job
+
+            self._erros.pop(id_job, None)
+            job = JobExportacao(id_job, nome_arquivo, media_type)
+            self._jobs[id_job] = job
+
+        self._executor.submit(self._executar, job, executar)
+        return job
+
+    def obter(self, id_job: str) -> Optional[JobExportacao]:
+        with self._lock:
+            return self._jobs.get(id_job)
+
+    def registrar_download(self, id_job: str):
+        with self._lock:
+            if id_job in self._arquivos:
+                self._arquivos.move_to_end(id_job)
+
+    def _executar(self, job: JobExportacao, executar: Callable[[JobExportacao, str], None]):
+        job.estado = "executando"
+        caminho = os.path.join(self._obter_diretorio(), job.id)
+        parcial = caminho + ".parcial"
+
+        try:
+            executar(job, parcial)
+            os.replace(parcial, caminho)
+        except Exception as e:
+            if os.path.exists(parcial):
+                os.remove(parcial)
+            job.erro = str(e)
+            job.concluido_em = datetime.now()
+            job.estado = "erro"
+
+            with self._lock:
+                # O job pode ter sido substituído por uma nova tentativa
+                if self._jobs.get(job.id) is job:
+                    self._erros[job.id] = job.concluido_em
+                self._remover_erros()
+            return
+
+        job.caminho = caminho
+        job.tamanho = os.path.getsize(caminho)
+        job.progresso = 100
+        job.etapa = None
+        job.concluido_em = datetime.now()
+        job.estado = "concluido"
+
+        with self._lock:
+            self._arquivos[job.id] = job.tamanho
+            self._remover_excedentes()
+
+    def _remover_excedentes(self):
+        # Mantém pelo menos o arquivo mais recente, mesmo que sozinho ultrapasse o limite
+        while len(self._arquivos) > 1 and sum(self._arquivos.values()) > self.tamanho_maximo:
+            id_job, _ = self._arquivos.popitem(last=False)
+            job = self._jobs.pop(id_job, None)
+            if job is not None and job.caminho and os.path.exists(job.caminho):
+                os.remove(job.caminho)
+
+    def _remover_erros(self):
+        limite = datetime.now() - self.validade_erros
+        while self._erros:
+            id_job, falha = next(iter(self._erros.items()))
+            if falha >= limite and len(self._erros) <= self.max_erros:
+                break
+            del self._erros[id_job]
+            self._jobs.pop(id_job, None)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "jobs": len(self._jobs),
+                "arquivos": len(self._arquivos),
+                "erros": len(self._erros),
+                "tamanho": sum(self._arquivos.values()),
+                "tamanho_maximo": self.tamanho_maximo,
+            }
+
+    def encerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._diretorio is not None:
+            shutil.rmtree(self._diretorio, ignore_errors=True)
+            self._diretorio = None
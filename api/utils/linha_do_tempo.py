@@ -0,0 +1,330 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlmodel import func, nulls_first, select
+
+from models.cargo import Cargo
+from models.ocupacao import Ocupacao
+from models.pessoa import Pessoa
+
+DATA_MAXIMA = date(9999, 12, 31)
+
+# Marca de "todos os cargos" no conjunto de cargos alterados por uma sessão
+TODOS = "*"
+
+
+class OcupacaoResumo(NamedTuple):
+    id_ocupacao: int
+    id_pessoa: int
+    data_inicio: Optional[date]
+    data_fim: Optional[date]
+    mandato: int
+
+
+class LinhaDoTempoCargo:
+    """
+    Ocupações de um cargo em ordem cronológica (data_inicio, nulos primeiro; id_ocupacao),
+    com índices para consultas em O(log n):
+    - sobreposição: com os inícios ordenados, o máximo acumulado das datas de fim é
+      não-decrescente, então a primeira ocupação que alcança o período é achada por bisseção;
+    - anterior/posterior a uma data, e a sequência de mandatos (mesma pessoa) de cada uma.
+    Imutável depois de construída: é compartilhada entre requisições.
+    """
+
+    def __init__(self, id_cargo: int, exclusivo: bool, ocupacoes: Iterable[OcupacaoResumo]):
+        self.id_cargo = id_cargo
+        self.exclusivo = exclusivo
+        self.ocupacoes: Tuple[OcupacaoResumo, ...] = tuple(ocupacoes)
+
+        self._chaves = [(o.data_inicio is not None, o.data_inicio or date.min, o.id_ocupacao) for o in self.ocupacoes]
+        self._max_fim = []
+        # Início e fim da sequência (mesma pessoa, consecutiva) de cada posição
+        self._inicio_sequencia = []
+        self._fim_sequencia = [0] * len(self.ocupacoes)
+
+        maior = None
+        for i, o in enumerate(self.ocupacoes):
+            fim = o.data_fim or DATA_MAXIMA
+            maior = fim if maior is None or fim > maior else maior
+            self._max_fim.append(maior)
+
+            continua = i > 0 and self.ocupacoes[i - 1].id_pessoa == o.id_pessoa
+            self._inicio_sequencia.append(self._inicio_sequencia[i - 1] if continua else i)
+
+        for i in range(len(self.ocupacoes) - 1, -1, -1):
+            continua = i + 1 < len(self.ocupacoes) and self.ocupacoes[i + 1].id_pessoa == self.ocupacoes[i].id_pessoa
+            self._fim_sequencia[i] = self._fim_sequencia[i + 1] if continua else i + 1
+
+    def __len__(self):
+        return len(self.ocupacoes)
+
+    def _limite_inicio(self, data: date) -> int:
+        # Quantidade de ocupações com data_inicio nula ou <= data (um prefixo da ordem)
+        return bisect_right(self._chaves, (True, data, float("inf")))
+
+    def sobrepostas(self, inicio: Optional[date], fim: Optional[date]) -> List[OcupacaoResumo]:
+        """Ocupações cujo período (datas nulas = abertas) intercepta [inicio, fim]."""
+        inicio = inicio or date.min
+        limite = self._limite_inicio(fim or DATA_MAXIMA)
+        primeira = bisect_left(self._max_fim, inicio, 0, limite)
+        return [
+            o for o in self.ocupacoes[primeira:limite]
+            if (o.data_fim or DATA_MAXIMA) >= inicio
+        ]
+
+    def primeira_sobreposta(self, inicio: Optional[date], fim: Optional[date]) -> Optional[OcupacaoResumo]:
+        inicio = inicio or date.min
+        limite = self._limite_inicio(fim or DATA_MAXIMA)
+        primeira = bisect_left(self._max_fim, inicio, 0, limite)
+        return self.ocupacoes[primeira] if primeira < limite else None
+
+    def vigentes_em(self, data: date) -> List[OcupacaoResumo]:
+        return self.sobrepostas(data, data)
+
+    def sem_data_inicio(self) -> Tuple[OcupacaoResumo, ...]:
+        """Ocupações sem data_inicio (o começo da ordem)."""
+        return self.ocupacoes[:bisect_left(self._chaves, (True,))]
+
+    def iniciadas_a_partir_de(self, data: date) -> Tuple[OcupacaoResumo, ...]:
+        """Ocupações com data_inicio preenchida e >= data, em ordem."""
+        return self.ocupacoes[bisect_left(self._chaves, (True, data, float("-inf"))):]
+
+    def sequencias_adjacentes(
+        self,
+        ponto: date,
+        id_ocupacao_ignorada: Optional[int] = None
+    ) -> Tuple[List[OcupacaoResumo], List[OcupacaoResumo]]:
+        """
+        (anteriores, posteriores) em volta de `ponto`, como em _get_sequencias_adjacentes:
+        anteriores termina na última ocupação com início nulo ou <= ponto e volta até o
+        começo da sequência dela; posteriores começa na primeira com início >= ponto e
+        segue até o fim da sequência dela.
+        """
+        if id_ocupacao_ignorada is not None:
+            restantes = [o for o in self.ocupacoes if o.id_ocupacao != id_ocupacao_ignorada]
+            if len(restantes) != len(self.ocupacoes):
+                return LinhaDoTempoCargo(self.id_cargo, self.exclusivo, restantes).sequencias_adjacentes(ponto)
+
+        antes = self._limite_inicio(ponto)
+        depois = bisect_left(self._chaves, (True, ponto, float("-inf")))
+
+        anteriores = list(self.ocupacoes[self._inicio_sequencia[antes - 1]:antes]) if antes > 0 else []
+        posteriores = list(self.ocupacoes[depois:self._fim_sequencia[depois]]) if depois < len(self.ocupacoes) else []
+        return anteriores, posteriores
+
+    def mandatos_seguidos_por_pessoa(self, ponto: date) -> dict:
+        """
+        Mandatos consecutivos no cargo de quem assumir uma nova ocupação em `ponto`: a nova,
+        a sequência da pessoa imediatamente antes e a imediatamente depois (regra 2).
+        Só as pessoas dessas sequências aparecem no dicionário; para as demais, é 1.
+        """
+        anteriores, posteriores = self.sequencias_adjacentes(ponto)
+
+        contagem = {}
+        if anteriores:
+            contagem[anteriores[-1].id_pessoa] = (anteriores[-1].mandato or 0) + 1
+        if posteriores:
+            id_pessoa = posteriores[0].id_pessoa
+            contagem[id_pessoa] = contagem.get(id_pessoa, 1) + len(posteriores)
+        return contagem
+
+    def mandatos_seguidos(self, id_pessoa: int, ponto: date) -> int:
+        return self.mandatos_seguidos_por_pessoa(ponto).get(id_pessoa, 1)
+
+
+def carregar_linhas_do_tempo(session: Session, ids_cargos: Iterable[int]) -> dict:
+    """Monta as linhas do tempo dos cargos informados com duas consultas (cargos e ocupações)."""
+    ids_cargos = set(ids_cargos)
+    if not ids_cargos:
+        return {}
+
+    exclusivos = dict(session.execute(
+        select(Cargo.id_cargo, Cargo.exclusivo).where(Cargo.id_cargo.in_(ids_cargos))
+    ).all())
+
+    ocupacoes = {id_cargo: [] for id_cargo in exclusivos}
+    linhas = session.execute(
+        select(
+            Ocupacao.id_cargo, Ocupacao.id_ocupacao, Ocupacao.id_pessoa,
+            Ocupacao.data_inicio, Ocupacao.data_fim, Ocupacao.mandato
+        )
+        .where(Ocupacao.id_cargo.in_(exclusivos))
+        .order_by(Ocupacao.id_cargo, nulls_first(Ocupacao.data_inicio.asc()), Ocupacao.id_ocupacao.asc())
+    ).all()
+    for id_cargo, *campos in linhas:
+        ocupacoes[id_cargo].append(OcupacaoResumo(*campos))
+
+    return {
+        id_cargo: LinhaDoTempoCargo(id_cargo, bool(exclusivo), ocupacoes[id_cargo])
+        for id_cargo, exclusivo in exclusivos.items()
+    }
+
+
+def validadores_cargos(session: Session, ids_cargos: Iterable[int]) -> dict:
+    """
+    Validador barato de cada cargo, numa consulta: updated_at do cargo e count(*) e
+    max(updated_at) das suas ocupações (mesmo critério de utils/etag.py). Cargos
+    inexistentes não aparecem no resultado.
+    """
+    ids_cargos = set(ids_cargos)
+    if not ids_cargos:
+        return {}
+
+    ocupacoes = (
+        select(
+            Ocupacao.id_cargo,
+            func.count().label("total"),
+            func.max(Ocupacao.updated_at).label("alteracao")
+        )
+        .where(Ocupacao.id_cargo.in_(ids_cargos))
+        .group_by(Ocupacao.id_cargo)
+        .subquery()
+    )
+    linhas = session.execute(
+        select(Cargo.id_cargo, Cargo.updated_at, ocupacoes.c.total, ocupacoes.c.alteracao)
+        .outerjoin(ocupacoes, ocupacoes.c.id_cargo == Cargo.id_cargo)
+        .where(Cargo.id_cargo.in_(ids_cargos))
+    ).all()
+
+    return {id_cargo: tuple(validador) for id_cargo, *validador in linhas}
+
+
+def cargos_com_escrita_pendente(session: Session) -> Set:
+    """Cargos alterados pela transação em andamento (já enviados ao banco ou ainda pendentes)."""
+    cargos = set(session.info.get("cargos_alterados", ()))
+    _coletar_cargos(session, cargos)
+    return cargos
+
+
+def _coletar_cargos(session: Session, cargos: Set):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Ocupacao):
+            cargos.add(obj.id_cargo)
+            # Ocupação movida de cargo: o cargo antigo também muda
+            cargos.update(v for v in inspect(obj).attrs.id_cargo.history.deleted if v is not None)
+        elif isinstance(obj, Cargo):
+            cargos.add(obj.id_cargo)
+        elif isinstance(obj, Pessoa) and obj in session.deleted:
+            cargos.add(TODOS)
+
+
+class CacheLinhasDoTempo:
+    """
+    Cache LRU, por processo, das linhas do tempo dos cargos. Cada commit descarta apenas
+    os cargos que alterou; escritas em massa (UPDATE/DELETE/INSERT por comando) na
+    tabela de ocupações ou de cargos descartam tudo.
+    Uma sessão com escritas ainda não efetivadas num cargo lê esse cargo direto do banco,
+    para enxergar as próprias alterações (sem guardar o resultado).
+    Escritas de outros processos (scripts/recalcular_mandatos.py, edições manuais) são
+    detectadas conferindo, a cada leitura, o validador de cada cargo (validadores_cargos).
+    Como o trigger grava em updated_at o início da transação, uma transação longa pode não
+    mudar o max(updated_at); por isso as entradas também expiram após `validade`.
+    """
+
+    def __init__(self, capacidade: int = 1024, validade: timedelta = timedelta(minutes=5)):
+        self.capacidade = capacidade
+        self.validade = validade
+        self.hits = 0
+        self.misses = 0
+        self._entradas = OrderedDict()
+        self._geracao = 0
+        self._lock = threading.Lock()
+
+    def obter(self, session: Session, id_cargo: int) -> Optional[LinhaDoTempoCargo]:
+        """Linha do tempo do cargo, ou None se o cargo não existir."""
+        return self.obter_varios(session, [id_cargo]).get(id_cargo)
+
+    def obter_varios(self, session: Session, ids_cargos: Iterable[int]) -> dict:
+        ids_cargos = set(ids_cargos)
+        pendentes = cargos_com_escrita_pendente(session)
+        if TODOS in pendentes:
+            return carregar_linhas_do_tempo(session, ids_cargos)
+
+        # Lido antes da carga: se houver escrita no meio, a entrada nasce desatualizada
+        # e é recarregada na próxima leitura
+        validadores = validadores_cargos(session, ids_cargos - pendentes)
+        agora = datetime.now()
+
+        resultado = {}
+        with self._lock:
+            for id_cargo, validador in validadores.items():
+                entrada = self._entradas.get(id_cargo)
+                if entrada is not None and entrada[0] == validador and entrada[1] > agora - self.validade:
+                    self._entradas.move_to_end(id_cargo)
+                    resultado[id_cargo] = entrada[2]
+            self.hits += len(resultado)
+            self.misses += len(ids_cargos) - len(resultado)
+            geracao = self._geracao
+
+        faltantes = ids_cargos - resultado.keys()
+        carregadas = carregar_linhas_do_tempo(session, faltantes)
+        resultado.update(carregadas)
+
+        with self._lock:
+            # Algo foi invalidado durante a carga: o resultado pode estar desatualizado
+            if geracao == self._geracao:
+                for id_cargo, linha in carregadas.items():
+                    if id_cargo in validadores:
+                        self._entradas[id_cargo] = (validadores[id_cargo], agora, linha)
+                        self._entradas.move_to_end(id_cargo)
+                while len(self._entradas) > self.capacidade:
+                    self._entradas.popitem(last=False)
+
+        return resultado
+
+    def invalidar(self, cargos: Iterable):
+        with self._lock:
+            self._geracao += 1
+            cargos = set(cargos)
+            if TODOS in cargos:
+                self._entradas.clear()
+                return
+            for id_cargo in cargos:
+                self._entradas.pop(id_cargo, None)
+
+    def limpar(self):
+        self.invalidar([TODOS])
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "tamanho": len(self._entradas),
+                "capacidade": self.capacidade,
+            }
+
+
+CACHE_LINHAS_DO_TEMPO = CacheLinhasDoTempo()
+
+
+@event.listens_for(Session, "before_flush")
+def _registrar_cargos_alterados(session, flush_context, instances):
+    _coletar_cargos(session, session.info.setdefault("cargos_alterados", set()))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _registrar_escrita_em_massa(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        tabela = getattr(orm_execute_state.statement, "table", None)
+        if tabela is not None and tabela.name in (Ocupacao.__tablename__, Cargo.__tablename__):
+            orm_execute_state.session.info.setdefault("cargos_alterados", set()).add(TODOS)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_apos_commit(session):
+    cargos = session.info.pop("cargos_alterados", None)
+    if cargos:
+        CACHE_LINHAS_DO_TEMPO.invalidar(cargos)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_cargos_apos_rollback(session, previous_transaction):
+    # O rollback de um savepoint não desfaz o restante da transação
+    if not previous_transaction.nested:
+        session.info.pop("cargos_alterados", None)